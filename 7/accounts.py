@@ -1,13 +1,51 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+from typing import Awaitable, Callable, Iterator, Literal, TypeVar
+import asyncio
 import json
+import time
 from dotenv import load_dotenv
 from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+from market import get_share_price, get_share_prices
+from database import (
+    write_account,
+    write_account_state,
+    read_account,
+    read_transactions,
+    read_recent_transactions,
+    read_account_version,
+    read_portfolio_snapshots,
+    record_trade,
+    record_trades,
+    write_aggregates,
+    write_portfolio_snapshot,
+    write_log,
+    transaction as write_transaction,
+    StaleAccountError,
+)
+import async_database
+
+T = TypeVar("T")
 
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
+PAGE_SIZE = 200  # rows fetched per query when iterating a lazy account's history
+AGGREGATES_VERSION = 1  # bump to make every account replay its history into the running totals again
+
+# the summary is what goes into the agent's prompt, so its size is capped whatever the account's age
+SUMMARY_TRANSACTIONS = 5       # most recent transactions listed
+SUMMARY_HOLDINGS = 20          # largest positions listed; the rest are folded into other_holdings
+SUMMARY_RATIONALE_CHARS = 160  # rationales are cut to this length
+SUMMARY_TTL_SECONDS = 300      # a cached summary is also rebuilt this often, as prices move
+
+_summaries: dict[str, tuple[int, float, str]] = {}  # name -> (account version, expires at, JSON)
+
+
+def spread_fee(quantity: int, price: float) -> float:
+    ''' What the spread cost on a fill at `price` (the buy/sell price already includes it) '''
+    if quantity > 0:
+        return quantity * price * SPREAD / (1 + SPREAD)
+    return -quantity * price * SPREAD / (1 - SPREAD)
 
 
 class Transaction(BaseModel):
@@ -22,6 +60,16 @@ class Transaction(BaseModel):
     
     def __repr__(self):
         return f'{abs(self.quantity)} shares of {self.symbol} at {self.price}'
+
+
+class Order(BaseModel):
+    ''' One buy or sell in a place_orders batch '''
+    model_config = ConfigDict(extra="forbid")
+
+    side: Literal["buy", "sell"]
+    symbol: str
+    quantity: int
+    rationale: str
     
 
 class Account(BaseModel):
@@ -31,26 +79,122 @@ class Account(BaseModel):
     holdings: dict[str, int]
     transactions: list[Transaction]
     portfolio_value_time_series: list[tuple[str, float]]
+    version: int = 0  # bumped by every committed write; a write from an older copy is refused
+
+    # running totals kept up to date on every trade, so P&L never needs the full history
+    net_invested: float = 0.0                        # sum of quantity * price over all transactions
+    realized_pnl: float = 0.0                        # FIFO
+    realized_pnl_avg: float = 0.0                    # average cost
+    fees: float = 0.0                                # paid through the spread
+    cost_basis: dict[str, float] = {}                # average-cost basis of the shares held, per symbol
+    lots: dict[str, list[tuple[int, float]]] = {}    # open FIFO (quantity, price) lots per symbol
+    aggregates_version: int = AGGREGATES_VERSION
+
+    # lazy accounts load balance, strategy and holdings only; history is paged from the DB on demand
+    _lazy: bool = PrivateAttr(default=False)
+
+    @staticmethod
+    def _new_account_fields(name: str) -> dict:
+        return {
+            "name": name.lower(),
+            "balance": INITIAL_BALANCE,
+            "strategy": "",
+            "holdings": {},
+            "transactions": [],
+            "portfolio_value_time_series": [],
+            "aggregates_version": AGGREGATES_VERSION,
+        }
 
     @classmethod
-    def get(cls, name: str):
-        fields = read_account(name.lower())
+    def get(cls, name: str, lazy: bool = False):
+        '''
+        Load the account, creating it on first use.
+
+        With lazy=True transactions and portfolio_value_time_series stay empty and are read
+        through iter_transactions / iter_portfolio_value_time_series instead, so loading costs
+        the same however old the account is.
+        '''
+        fields = read_account(name.lower(), with_history=not lazy)
         if not fields:
-            fields = {
-                "name": name.lower(),
-                "balance": INITIAL_BALANCE,
-                "strategy": "",
-                "holdings": {},
-                "transactions": [],
-                "portfolio_value_time_series": []
-            }
+            fields = cls._new_account_fields(name)
             write_account(name, fields)
-        return cls(**fields)
+        account = cls(**fields)
+        account._lazy = lazy
+        if account.aggregates_version < AGGREGATES_VERSION:
+            account._backfill_aggregates()
+        return account
+
+    @classmethod
+    async def aget(cls, name: str, lazy: bool = False):
+        ''' Async twin of get() for the MCP servers '''
+        fields = await async_database.read_account(name.lower(), with_history=not lazy)
+        if not fields:
+            fields = cls._new_account_fields(name)
+            await async_database.write_account(name, fields)
+        account = cls(**fields)
+        account._lazy = lazy
+        if account.aggregates_version < AGGREGATES_VERSION:
+            await asyncio.to_thread(account._backfill_aggregates)
+        return account
+
+    def _backfill_aggregates(self) -> None:
+        ''' One-off for accounts stored before the running totals existed: replay the history '''
+        self.net_invested = self.realized_pnl = self.realized_pnl_avg = self.fees = 0.0
+        self.cost_basis, self.lots = {}, {}
+        for transaction in self.iter_transactions():
+            self._apply_fill(transaction.symbol, transaction.quantity, transaction.price)
+        self.aggregates_version = AGGREGATES_VERSION
+        write_aggregates(self.name, self._aggregates(), self.cost_basis, self.lots)
     
 
     def save(self):
-        # 使用model_dump()將資料轉為dict or json 才能存入資料庫
-        write_account(self.name.lower(), self.model_dump())
+        # only balance, strategy and holdings; transactions and the time series are appended as they happen
+        _summaries.pop(self.name, None)
+        write_account_state(self.name, self.balance, self.strategy, self.holdings, self.cost_basis, self.version)
+        self.version += 1
+
+    async def asave(self):
+        _summaries.pop(self.name, None)
+        await async_database.write_account_state(self.name, self.balance, self.strategy, self.holdings, self.cost_basis, self.version)
+        self.version += 1
+
+    def _load_fields(self, fields: dict) -> None:
+        for field, value in type(self)(**fields):
+            setattr(self, field, value)
+
+    def _commit(self, change: Callable[[], T], persist: Callable[[T], None]) -> T:
+        '''
+        Apply change() to this copy and persist() what it returns as one versioned write.
+        If another writer (a concurrent tool call, another process) committed since this copy
+        was read, persist raises StaleAccountError and writes nothing; then reload and redo the
+        change - checks such as funds included - inside the write transaction, so the second
+        attempt can't be overtaken.
+        '''
+        try:
+            result = change()
+            persist(result)
+            return result
+        except StaleAccountError:
+            pass
+        with write_transaction():
+            self._load_fields(read_account(self.name, with_history=not self._lazy))
+            result = change()
+            persist(result)
+        return result
+
+    async def _acommit(self, change: Callable[[], T], persist: Callable[[T], Awaitable[None]]) -> T:
+        ''' Async twin of _commit() '''
+        try:
+            result = change()
+            await persist(result)
+            return result
+        except StaleAccountError:
+            pass
+        async with async_database.transaction():
+            self._load_fields(await async_database.read_account(self.name, with_history=not self._lazy))
+            result = change()
+            await persist(result)
+        return result
 
     
     def reset(self, strategy: str):
@@ -59,30 +203,40 @@ class Account(BaseModel):
         self.holdings = {}
         self.transactions = []
         self.portfolio_value_time_series = []
-        self.save()
+        self.net_invested = self.realized_pnl = self.realized_pnl_avg = self.fees = 0.0
+        self.cost_basis, self.lots = {}, {}
+        self.aggregates_version = AGGREGATES_VERSION
+        _summaries.pop(self.name, None)
+        # 使用model_dump()將資料轉為dict or json 才能存入資料庫
+        write_account(self.name, self.model_dump())
+        # the overwrite bumped the version; copies read before it can no longer write
+        self.version = read_account(self.name, with_history=False)["version"]
     
 
     def deposit(self, amount: float):
         ''' Deposit funds into the account '''
         if amount <= 0:
             raise ValueError('Deposit amount should be positive number')
-        self.balance += amount
+
+        def change():
+            self.balance += amount
+
+        self._commit(change, lambda _: self.save())
         print(f'Deposied ${amount}. New balance: ${self.balance}')
-        self.save()
     
 
     def withdraw(self, amount: float):
         ''' Withdraw funds from the account '''
-        if amount > self.balance:
-            raise ValueError('Insufficient funds for withdrawal.')
-        self.balance -= amount
+        def change():
+            if amount > self.balance:
+                raise ValueError('Insufficient funds for withdrawal.')
+            self.balance -= amount
+
+        self._commit(change, lambda _: self.save())
         print(f"Withdrew ${amount}. New balance: ${self.balance}")
-        self.save()
     
 
-    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        ''' buy shares if sufficient funds '''
-        price = get_share_price(symbol)
+    def _apply_buy(self, symbol: str, quantity: int, rationale: str, price: float) -> Transaction:
         buy_price = price * (1 + SPREAD)
         total_cost = buy_price * quantity
 
@@ -91,27 +245,99 @@ class Account(BaseModel):
         elif price == 0:
             raise ValueError(f"Unrecognized symbol {symbol}")
         
-        ## actions should be transaction in DB. this one just mock so keep as simple as it is.
-
         # update holdings
         self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         # record transaction
         transaction = Transaction(symbol=symbol, quantity=quantity, price = buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
+        if not self._lazy:
+            self.transactions.append(transaction)
+        self._apply_fill(symbol, quantity, buy_price)
 
         # update balance
         self.balance -= total_cost
-        self.save()
-        write_log(self.name, 'account', f'Bought {quantity} of {symbol}')
+        return transaction
+
+    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        ''' buy shares if sufficient funds '''
+        price = get_share_price(symbol)
+        self._commit(
+            lambda: self._apply_buy(symbol, quantity, rationale, price),
+            lambda transaction: self._record_trade(transaction, f'Bought {quantity} of {symbol}'),
+        )
         return "Completed. Latest details:\n" + self.report()
+
+    async def abuy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        ''' Async twin of buy_shares(); the price lookup runs in a worker thread '''
+        price = await asyncio.to_thread(get_share_price, symbol)
+        await self._acommit(
+            lambda: self._apply_buy(symbol, quantity, rationale, price),
+            lambda transaction: self._arecord_trade(transaction, f'Bought {quantity} of {symbol}'),
+        )
+        return "Completed. Latest details:\n" + await self.areport()
     
-    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        ''' Sell shares if account got enough '''
+    def _apply_fill(self, symbol: str, quantity: int, price: float) -> None:
+        ''' Fold one fill (quantity < 0 for a sell) into the running totals, cost basis and lots '''
+        self.net_invested += quantity * price
+        self.fees += spread_fee(quantity, price)
+        lots = self.lots.setdefault(symbol, [])
+        if quantity > 0:
+            lots.append((quantity, price))
+            self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) + quantity * price
+        else:
+            sold = -quantity
+            held = sum(lot_quantity for lot_quantity, _ in lots)
+            average = self.cost_basis.get(symbol, 0.0) / held if held else 0.0
+            self.realized_pnl_avg += sold * (price - average)
+            self.cost_basis[symbol] = self.cost_basis.get(symbol, 0.0) - min(sold, held) * average
+            while sold and lots:
+                lot_quantity, lot_price = lots[0]
+                taken = min(sold, lot_quantity)
+                self.realized_pnl += taken * (price - lot_price)
+                sold -= taken
+                if taken == lot_quantity:
+                    lots.pop(0)
+                else:
+                    lots[0] = (lot_quantity - taken, lot_price)
+            # shares with no recorded buy (history edited by hand) have no cost
+            self.realized_pnl += sold * price
+        if not lots:
+            del self.lots[symbol]
+            self.cost_basis.pop(symbol, None)
+
+    def _aggregates(self) -> dict:
+        return {
+            "net_invested": self.net_invested,
+            "realized_pnl": self.realized_pnl,
+            "realized_pnl_avg": self.realized_pnl_avg,
+            "fees": self.fees,
+            "aggregates_version": self.aggregates_version,
+        }
+
+    def _trade_delta(self, transaction: Transaction, message: str) -> tuple:
+        # write only the delta: balance, totals, this symbol's holding, cost and lots, the new transaction row and its log line
+        symbol = transaction.symbol
+        return (
+            self.name, self.balance, symbol, self.holdings.get(symbol, 0), transaction.model_dump(),
+            self._aggregates(), self.cost_basis.get(symbol, 0.0), self.lots.get(symbol, []),
+            self.version, message,
+        )
+
+    def _record_trade(self, transaction: Transaction, message: str) -> None:
+        record_trade(*self._trade_delta(transaction, message))
+        self.version += 1
+
+    async def _arecord_trade(self, transaction: Transaction, message: str) -> None:
+        await async_database.record_trade(*self._trade_delta(transaction, message))
+        self.version += 1
+
+    def _check_can_sell(self, symbol: str, quantity: int) -> None:
         if self.holdings.get(symbol, 0) < quantity:
             raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
-        price = get_share_price(symbol)
+
+    def _apply_sell(self, symbol: str, quantity: int, rationale: str, price: float) -> Transaction:
+        self._check_can_sell(symbol, quantity)
         sell_price = price * (1 - SPREAD)
         total_proceeds = sell_price * quantity
 
@@ -121,27 +347,152 @@ class Account(BaseModel):
         
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
+        if not self._lazy:
+            self.transactions.append(transaction)
+        self._apply_fill(symbol, -quantity, sell_price)
 
         self.balance += total_proceeds
-        self.save()
-        write_log(self.name, 'account', f"Sold {quantity} of {symbol}")
+        return transaction
+
+    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        ''' Sell shares if account got enough '''
+        self._check_can_sell(symbol, quantity)
+        price = get_share_price(symbol)
+        self._commit(
+            lambda: self._apply_sell(symbol, quantity, rationale, price),
+            lambda transaction: self._record_trade(transaction, f"Sold {quantity} of {symbol}"),
+        )
         return "Completed. Latest details:\n" + self.report()
+
+    async def asell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        ''' Async twin of sell_shares() '''
+        self._check_can_sell(symbol, quantity)
+        price = await asyncio.to_thread(get_share_price, symbol)
+        await self._acommit(
+            lambda: self._apply_sell(symbol, quantity, rationale, price),
+            lambda transaction: self._arecord_trade(transaction, f"Sold {quantity} of {symbol}"),
+        )
+        return "Completed. Latest details:\n" + await self.areport()
+    
+
+    def _apply_orders(self, orders: list[Order], prices: dict[str, float]) -> list[Transaction]:
+        ''' Apply the orders to this copy in turn, or none of them: a rejected order restores the copy '''
+        before = self.model_dump()
+        transactions = []
+        for i, order in enumerate(orders, 1):
+            try:
+                if order.quantity <= 0:
+                    raise ValueError("Quantity should be a positive number")
+                if order.side == "buy":
+                    transactions.append(self._apply_buy(order.symbol, order.quantity, order.rationale, prices[order.symbol]))
+                else:
+                    transactions.append(self._apply_sell(order.symbol, order.quantity, order.rationale, prices[order.symbol]))
+            except ValueError as e:
+                self._load_fields(before)
+                raise ValueError(f"Order {i} ({order.side} {order.quantity} {order.symbol}) rejected, so no orders were placed: {e}") from e
+        return transactions
+
+    def _orders_delta(self, transactions: list[Transaction]) -> tuple:
+        # the final position of each traded symbol, every transaction row and a log line per order
+        symbols = dict.fromkeys(transaction.symbol for transaction in transactions)
+        positions = {
+            symbol: (self.holdings.get(symbol, 0), self.cost_basis.get(symbol, 0.0), self.lots.get(symbol, []))
+            for symbol in symbols
+        }
+        messages = [
+            f"Bought {t.quantity} of {t.symbol}" if t.quantity > 0 else f"Sold {-t.quantity} of {t.symbol}"
+            for t in transactions
+        ]
+        trades = [transaction.model_dump() for transaction in transactions]
+        return self.name, self.balance, self._aggregates(), positions, trades, messages, self.version
+
+    def _record_trades(self, transactions: list[Transaction]) -> None:
+        record_trades(*self._orders_delta(transactions))
+        self.version += 1
+
+    async def _arecord_trades(self, transactions: list[Transaction]) -> None:
+        await async_database.record_trades(*self._orders_delta(transactions))
+        self.version += 1
+
+    def _orders_result(self, transactions: list[Transaction], prices: dict[str, float]) -> tuple[str, float, str]:
+        ''' (timestamp, portfolio value, compact JSON result) after a batch '''
+        portfolio_value = self.calculate_portfolio_value(prices)
+        result = {
+            "filled": [
+                {
+                    "side": "buy" if t.quantity > 0 else "sell",
+                    "symbol": t.symbol,
+                    "quantity": abs(t.quantity),
+                    "price": round(t.price, 2),
+                }
+                for t in transactions
+            ],
+            "balance": round(self.balance, 2),
+            "holdings": self.holdings,
+            "total_portfolio_value": round(portfolio_value, 2),
+            "total_profit_loss": round(self.calculate_profit_loss(portfolio_value), 2),
+        }
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return timestamp, portfolio_value, json.dumps(result, separators=(",", ":"))
+
+    def place_orders(self, orders: list[Order | dict]) -> str:
+        '''
+        Buy and sell several stocks at once: every symbol (and holding) is priced in one batched
+        lookup, the orders are filled in the order given and committed in one transaction - all
+        of them or, if any is rejected, none - and the result is a compact JSON summary.
+        '''
+        orders = [Order.model_validate(order) for order in orders]
+        if not orders:
+            raise ValueError("No orders given")
+        prices = get_share_prices([order.symbol for order in orders] + list(self.holdings))
+        transactions = self._commit(lambda: self._apply_orders(orders, prices), self._record_trades)
+        # a retry may have reloaded holdings that weren't priced yet
+        if missing := set(self.holdings) - prices.keys():
+            prices |= get_share_prices(missing)
+        timestamp, portfolio_value, result = self._orders_result(transactions, prices)
+        write_portfolio_snapshot(self.name, timestamp, portfolio_value)
+        return result
+
+    async def aplace_orders(self, orders: list[Order | dict]) -> str:
+        ''' Async twin of place_orders(); the price lookups run in a worker thread '''
+        orders = [Order.model_validate(order) for order in orders]
+        if not orders:
+            raise ValueError("No orders given")
+        prices = await asyncio.to_thread(get_share_prices, [order.symbol for order in orders] + list(self.holdings))
+        transactions = await self._acommit(lambda: self._apply_orders(orders, prices), self._arecord_trades)
+        if missing := set(self.holdings) - prices.keys():
+            prices |= await asyncio.to_thread(get_share_prices, missing)
+        timestamp, portfolio_value, result = self._orders_result(transactions, prices)
+        await async_database.write_portfolio_snapshot(self.name, timestamp, portfolio_value)
+        return result
     
 
-    def calculate_portfolio_value(self):
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
         """ Calculate the total value of the user's portfolio """
         total_value = self.balance
+        prices = prices or get_share_prices(self.holdings)  # one batched lookup for every holding
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices[symbol] * quantity
         
         return total_value
     
     
     def calculate_profit_loss(self, porfolio_value: float):
         ''' Calculate account profit or loss from the initial spend '''
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return porfolio_value - initial_spend - self.balance
+        # net_invested is the running sum of every transaction's total(), so this is O(1)
+        return porfolio_value - self.net_invested - self.balance
+
+    def get_cost_basis(self, method: str = "fifo") -> dict[str, float]:
+        ''' Cost of the shares held per symbol, by "fifo" lots or "average" cost '''
+        if method == "average":
+            return dict(self.cost_basis)
+        return {symbol: sum(quantity * price for quantity, price in lots) for symbol, lots in self.lots.items()}
+
+    def calculate_unrealized_pnl(self, prices: dict[str, float] | None = None, method: str = "fifo") -> float:
+        ''' Market value of the holdings less their cost basis; O(holdings) '''
+        prices = prices or get_share_prices(self.holdings)
+        cost_basis = self.get_cost_basis(method)
+        return sum(prices[symbol] * quantity - cost_basis.get(symbol, 0.0) for symbol, quantity in self.holdings.items())
     
 
     def get_holdings(self):
@@ -156,39 +507,186 @@ class Account(BaseModel):
     
     def list_transactions(self):
         '''List all transactions of this account'''
-        return [transaction.model_dump() for transaction in self.transactions]
+        return [transaction.model_dump() for transaction in self.iter_transactions()]
+
+    def iter_transactions(self, page_size: int = PAGE_SIZE) -> Iterator[Transaction]:
+        ''' Yield transactions oldest first; a lazy account pages them from the DB '''
+        if not self._lazy:
+            yield from self.transactions
+            return
+        after_id = 0
+        while True:
+            page = read_transactions(self.name, after_id, page_size)
+            for _, fields in page:
+                yield Transaction(**fields)
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
+
+    def get_recent_transactions(self, limit: int = 10) -> list[Transaction]:
+        ''' The last `limit` transactions, newest first '''
+        if not self._lazy:
+            return self.transactions[::-1][:limit]
+        return [Transaction(**fields) for fields in read_recent_transactions(self.name, limit)]
+
+    def iter_portfolio_value_time_series(self, page_size: int = PAGE_SIZE) -> Iterator[tuple[str, float]]:
+        ''' Yield (datetime, value) points oldest first; a lazy account pages them from the DB '''
+        if not self._lazy:
+            yield from self.portfolio_value_time_series
+            return
+        after_id = 0
+        while True:
+            page = read_portfolio_snapshots(self.name, after_id, page_size)
+            for _, timestamp, value in page:
+                yield (timestamp, value)
+            if len(page) < page_size:
+                return
+            after_id = page[-1][0]
     
 
-    def report(self) -> str:
-        '''Return a json string representing the account. '''
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
+    def _add_portfolio_value_point(self) -> tuple[str, float]:
+        point = (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), self.calculate_portfolio_value())
+        if not self._lazy:
+            self.portfolio_value_time_series.append(point)
+        return point
 
+    def _report_json(self, portfolio_value: float) -> str:
         pnl = self.calculate_profit_loss(portfolio_value)
         data = self.model_dump()
+        if self._lazy:
+            data['transactions'] = self.list_transactions()
+            data['portfolio_value_time_series'] = list(self.iter_portfolio_value_time_series())
+        data.pop('lots')
         data['total_portfolio_value'] = portfolio_value
         data["total_profit_loss"] = pnl
+        # holdings are worth portfolio_value - balance, so no second price lookup is needed
+        data['unrealized_pnl'] = portfolio_value - self.balance - sum(self.get_cost_basis().values())
+        return json.dumps(data)
 
+    def report(self) -> str:
+        '''Return a json string representing the account. '''
+        timestamp, portfolio_value = self._add_portfolio_value_point()
+        write_portfolio_snapshot(self.name, timestamp, portfolio_value)
         write_log(self.name, 'account', f'Retrieved account details')
-        return json.dumps(data)
+        return self._report_json(portfolio_value)
+
+    async def areport(self) -> str:
+        ''' Async twin of report(); price lookups run in a worker thread '''
+        timestamp, portfolio_value = await asyncio.to_thread(self._add_portfolio_value_point)
+        await async_database.write_portfolio_snapshot(self.name, timestamp, portfolio_value)
+        await async_database.write_log(self.name, 'account', f'Retrieved account details')
+        # a lazy account pages its history in here, so keep the JSON building off the event loop too
+        return await asyncio.to_thread(self._report_json, portfolio_value)
+    
+
+    def summary(self, prices: dict[str, float] | None = None, recent: list[Transaction] | None = None) -> dict:
+        '''
+        Compact view of the account for prompts: balance, positions with their P&L, totals and
+        the last few trades. Reads only; nothing is recorded or saved.
+        '''
+        prices = prices if prices is not None else get_share_prices(self.holdings)
+        recent = recent if recent is not None else self.get_recent_transactions(SUMMARY_TRANSACTIONS)
+        cost_basis = self.get_cost_basis()
+        positions = sorted(
+            ((symbol, quantity, prices[symbol] * quantity) for symbol, quantity in self.holdings.items()),
+            key=lambda position: position[2],
+            reverse=True,
+        )
+        portfolio_value = self.balance + sum(value for _, _, value in positions)
+        data = {
+            "name": self.name,
+            "balance": round(self.balance, 2),
+            "holdings": {
+                symbol: {
+                    "quantity": quantity,
+                    "price": round(prices[symbol], 2),
+                    "value": round(value, 2),
+                    "unrealized_pnl": round(value - cost_basis.get(symbol, 0.0), 2),
+                }
+                for symbol, quantity, value in positions[:SUMMARY_HOLDINGS]
+            },
+        }
+        if len(positions) > SUMMARY_HOLDINGS:
+            rest = positions[SUMMARY_HOLDINGS:]
+            data["other_holdings"] = {"count": len(rest), "value": round(sum(value for _, _, value in rest), 2)}
+        data.update({
+            "total_portfolio_value": round(portfolio_value, 2),
+            "total_profit_loss": round(self.calculate_profit_loss(portfolio_value), 2),
+            "realized_pnl": round(self.realized_pnl, 2),
+            "unrealized_pnl": round(portfolio_value - self.balance - sum(cost_basis.values()), 2),
+            "fees": round(self.fees, 2),
+            "recent_transactions": [
+                {**transaction.model_dump(), "rationale": transaction.rationale[:SUMMARY_RATIONALE_CHARS]}
+                for transaction in recent[:SUMMARY_TRANSACTIONS]
+            ],
+        })
+        return data
+
+    @staticmethod
+    def _cached_summary(name: str, version: int) -> str | None:
+        cached = _summaries.get(name)
+        if cached and cached[0] == version and cached[1] > time.monotonic():
+            return cached[2]
+        return None
+
+    @staticmethod
+    def _cache_summary(name: str, version: int, summary: dict) -> str:
+        summary_json = json.dumps(summary, separators=(",", ":"))
+        _summaries[name] = (version, time.monotonic() + SUMMARY_TTL_SECONDS, summary_json)
+        return summary_json
+
+    @classmethod
+    def get_summary(cls, name: str) -> str:
+        '''
+        summary() as compact JSON, cached until the account is next written (its version changes,
+        which also catches trades, deposits and resets made by other processes) or
+        SUMMARY_TTL_SECONDS pass.
+        '''
+        name = name.lower()
+        version = read_account_version(name)
+        if cached := cls._cached_summary(name, version):
+            return cached
+        return cls._cache_summary(name, version, cls.get(name, lazy=True).summary())
+
+    @classmethod
+    async def aget_summary(cls, name: str) -> str:
+        ''' Async twin of get_summary(); a cache hit costs one indexed query '''
+        name = name.lower()
+        version = await async_database.read_account_version(name)
+        if cached := cls._cached_summary(name, version):
+            return cached
+        account = await cls.aget(name, lazy=True)
+        recent = [Transaction(**fields) for fields in await async_database.read_recent_transactions(name, SUMMARY_TRANSACTIONS)]
+        summary = await asyncio.to_thread(account.summary, None, recent)
+        return cls._cache_summary(name, version, summary)
     
 
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
         write_log(self.name, "account", f"Retrieved strategy")
         return self.strategy
+
+    async def aget_strategy(self) -> str:
+        await async_database.write_log(self.name, "account", f"Retrieved strategy")
+        return self.strategy
     
 
     def change_strategy(self, strategy: str) -> str:
         old_strategy = self.strategy
-        self.strategy = strategy
-        self.save()
-        write_log(self.name, 'account', f"Changed strategy")
-        return f'strategy changed from {old_strategy} to {strategy}'
 
+        def change():
+            self.strategy = strategy
 
+        self._commit(change, lambda _: self.save())
+        write_log(self.name, 'account', f"Changed strategy")
+        return f'strategy changed from {old_strategy} to {strategy}'
 
+    async def achange_strategy(self, strategy: str) -> str:
+        old_strategy = self.strategy
 
-        
+        def change():
+            self.strategy = strategy
 
+        await self._acommit(change, lambda _: self.asave())
+        await async_database.write_log(self.name, 'account', f"Changed strategy")
+        return f'strategy changed from {old_strategy} to {strategy}'
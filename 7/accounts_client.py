@@ -1,58 +1,177 @@
+import asyncio
+import weakref
 import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
 from agents import FunctionTool
 import json
+from datetime import timedelta
 from pydantic import AnyUrl
 from mcp.types import TextResourceContents
 
 params = StdioServerParameters(command='uv', args=['run', 'accounts_server.py'], env=None)
 
+REQUEST_TIMEOUT_SECONDS = 120
+CONNECT_TIMEOUT_SECONDS = 60
+RECONNECT_BACKOFF_SECONDS = 1
+
+
+class AccountsClient:
+    '''
+    One long-lived accounts_server process and initialized ClientSession, shared by every caller.
+
+    The session is opened and closed by its own task (stdio_client is an anyio task group, so it
+    must be exited by the task that entered it). Concurrent requests are multiplexed over the one
+    session by MCP request id. If the transport breaks the session is dropped and re-established;
+    reads are retried once on the new session, tool calls are not (a buy may already have happened).
+
+        async with AccountsClient() as client:
+            tools = await client.list_tools()
+    '''
+
+    def __init__(self, server_params: StdioServerParameters = params):
+        self.server_params = server_params
+        self.session: mcp.ClientSession | None = None
+        self.reconnects = 0
+        self.last_error: str | None = None
+        self._task: asyncio.Task | None = None
+        self._ready = asyncio.Event()
+        self._reconnect = asyncio.Event()
+        self._closed = asyncio.Event()
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _run(self) -> None:
+        while not self._closed.is_set():
+            try:
+                async with stdio_client(self.server_params) as streams:
+                    # streams = (read_stream, write_stream)
+                    async with mcp.ClientSession(
+                        *streams, read_timeout_seconds=timedelta(seconds=REQUEST_TIMEOUT_SECONDS)
+                    ) as session:
+                        await session.initialize() # 等待握手
+                        self.session = session
+                        self._ready.set()
+                        closed = asyncio.create_task(self._closed.wait())
+                        reconnect = asyncio.create_task(self._reconnect.wait())
+                        await asyncio.wait([closed, reconnect], return_when=asyncio.FIRST_COMPLETED)
+                        closed.cancel()
+                        reconnect.cancel()
+            except Exception as e:
+                self.last_error = f"session failed: {e!r}"
+                await asyncio.sleep(RECONNECT_BACKOFF_SECONDS)
+            finally:
+                self._ready.clear()
+                self.session = None
+            if self._reconnect.is_set():
+                self._reconnect.clear()
+                self.reconnects += 1
+
+    async def _get_session(self) -> mcp.ClientSession:
+        if self._closed.is_set():
+            raise RuntimeError("AccountsClient is closed")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="accounts-client")
+        try:
+            async with asyncio.timeout(CONNECT_TIMEOUT_SECONDS):
+                while self.session is None or not self._ready.is_set():
+                    await self._ready.wait()
+        except TimeoutError:
+            raise RuntimeError(f"accounts server is not available: {self.last_error}") from None
+        return self.session
+
+    def _drop(self, session: mcp.ClientSession, error: Exception) -> None:
+        # only the first caller to see a broken session triggers the reconnect
+        if self.session is session:
+            self._ready.clear()
+            self.last_error = repr(error)
+            self._reconnect.set()
+
+    async def _request(self, method: str, *args, retry: bool = True):
+        session = await self._get_session()
+        try:
+            return await getattr(session, method)(*args)
+        except McpError:
+            # an error answer from the server; the session itself is fine
+            raise
+        except Exception as e:
+            self._drop(session, e)
+            if not retry:
+                raise
+        session = await self._get_session()
+        return await getattr(session, method)(*args)
+
+    async def _read_text_resource(self, uri: str) -> str:
+        result = await self._request("read_resource", AnyUrl(uri))
+        content = result.contents[0]
+        if isinstance(content, TextResourceContents):
+            return content.text
+        raise ValueError(f"Expected text, got binary blob")
+
+    async def list_tools(self):
+        tools_results = await self._request("list_tools")
+        return tools_results.tools
+
+    async def call_tool(self, tool_name, tool_args):
+        return await self._request("call_tool", tool_name, tool_args, retry=False)
+
+    async def read_accounts_resource(self, name):
+        return await self._read_text_resource(f"accounts://accounts_server/{name}")
+
+    async def read_summary_resource(self, name):
+        return await self._read_text_resource(f"accounts://summary/{name}")
+
+    async def read_strategy_resource(self, name):
+        return await self._read_text_resource(f"accounts://strategy/{name}")
+
+    async def close(self) -> None:
+        self._closed.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AccountsClient] = weakref.WeakKeyDictionary()
+
+
+def get_accounts_client() -> AccountsClient:
+    ''' The shared client for the running event loop (asyncio objects can't cross loops) '''
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _clients[loop] = AccountsClient()
+    return _clients[loop]
+
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams: 
-        # streams = (read_stream, write_stream)
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize() # 等待握手
-            tools_results = await session.list_tools()
-            return tools_results.tools
+    return await get_accounts_client().list_tools()
 
 async def call_account_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
+    return await get_accounts_client().call_tool(tool_name, tool_args)
 
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(AnyUrl(f"accounts://accounts_server/{name}"))
-            content = result.contents[0]
-            if isinstance(content, TextResourceContents):
-                return content.text
-            raise ValueError(f"Expected text, got binary blob")
-        
+    return await get_accounts_client().read_accounts_resource(name)
+
+async def read_summary_resource(name):
+    return await get_accounts_client().read_summary_resource(name)
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(AnyUrl(f"accounts://strategy/{name}"))
-            content = result.contents[0]
-            if isinstance(content, TextResourceContents):
-                return content.text
-            raise ValueError(f"Expected text, got binary blob")
-
-async def get_accounts_tools_openai():
+    return await get_accounts_client().read_strategy_resource(name)
+
+async def get_accounts_tools_openai(client: AccountsClient | None = None):
+    client = client or get_accounts_client()
     openai_tools = []
-    for tool in await list_accounts_tools():
+    for tool in await client.list_tools():
         schema = {**tool.inputSchema, "additionalProperties": False}
         openai_tool = FunctionTool(
             name=tool.name,
             description=tool.description or 'tool without description',
             params_json_schema=schema,
-            on_invoke_tool=lambda ctx, args, toolname=tool.name: call_account_tool(toolname, json.loads(args))
+            on_invoke_tool=lambda ctx, args, toolname=tool.name: client.call_tool(toolname, json.loads(args))
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
@@ -1,10 +1,27 @@
+from contextlib import asynccontextmanager
+import anyio
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from accounts import Account, Order
+import async_database
 
-mcp = FastMCP('accounts_server') # define MCP server naming for access
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    # aiosqlite runs each connection on a non-daemon thread; close them or the process never exits
+    try:
+        yield {}
+    finally:
+        # shielded: mounted in-process, the server is stopped by cancelling its task group
+        with anyio.CancelScope(shield=True):
+            await async_database.close_connections()
+
+
+mcp = FastMCP('accounts_server', lifespan=lifespan) # define MCP server naming for access
 
 
 """Wrap functions by @mcp.tool() for agent access as tool with good descriptions. These functions will be called by the agent to interact with the accounts."""
+# tools go through the aiosqlite paths (Account.aget / asave ...) so concurrent calls overlap on the event loop,
+# and load accounts lazily so they don't pay for the transaction history they never read
 @mcp.tool()
 async def get_balance(name: str) -> float:
     """Get the cash balance of the given account name.
@@ -12,7 +29,7 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    return (await Account.aget(name, lazy=True)).balance
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -21,7 +38,7 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    return (await Account.aget(name, lazy=True)).holdings
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> str:
@@ -33,7 +50,7 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> s
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    return await (await Account.aget(name, lazy=True)).abuy_shares(symbol, quantity, rationale)
 
 
 @mcp.tool()
@@ -46,7 +63,19 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    return await (await Account.aget(name, lazy=True)).asell_shares(symbol, quantity, rationale)
+
+@mcp.tool()
+async def place_orders(name: str, orders: list[Order]) -> str:
+    """Buy and/or sell several stocks in one call; use this instead of repeated buy_shares / sell_shares calls when making more than one trade.
+    The orders are priced together and filled in the order given, as one transaction: if any order can't be filled
+    (insufficient funds or shares, unknown symbol), none of them are.
+
+    Args:
+        name: The name of the account holder
+        orders: The orders, each with side ("buy" or "sell"), symbol, quantity and the rationale for it
+    """
+    return await (await Account.aget(name, lazy=True)).aplace_orders(orders)
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -56,17 +85,22 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    return await (await Account.aget(name, lazy=True)).achange_strategy(strategy)
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    account = await Account.aget(name.lower(), lazy=True)
+    return await account.areport()
+
+@mcp.resource("accounts://summary/{name}")
+async def read_summary_resource(name: str) -> str:
+    # read-only and cached until the next trade: what the traders put in their prompts
+    return await Account.aget_summary(name)
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    account = await Account.aget(name.lower(), lazy=True)
+    return await account.aget_strategy()
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
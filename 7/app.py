@@ -1,10 +1,15 @@
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
 import gradio as gr
 from util import css, js, Color
 import pandas as pd  # for data handling
-import plotly.express as px  # for data chart
 from trading_floor import names, lastnames, short_model_names
 from accounts import Account
-from database import read_log
+from database import read_log_since, read_metrics, read_metrics_summary, EVENT_ACCOUNT, EVENT_LOG, EVENT_METRICS
+from events import get_watcher
+from charts import PortfolioChart
 
 mapper = {
     "trace": Color.WHITE,
@@ -15,12 +20,21 @@ mapper = {
     "account": Color.RED,
 }
 
+LOG_LINES = 13
+METRICS_RUNS = 10  # runs averaged in each trader's metrics line
+METRICS_DAYS = 7   # runs summarized in the floor-wide cost table
+METRICS_SUMMARY_HEADERS = ["Trader", "Model", "Runs", "Avg s", "Max s", "Avg turns", "Avg tokens", "Total tokens", "Avg tools", "Errors"]
+
 class Trader:
     def __init__(self, name: str, lastname: str, model_name: str):
         self.name = name
         self.lastname = lastname
         self.model_name = model_name
         self.account = Account.get(name)
+        self.chart = PortfolioChart(name)
+        self.log_lines = deque(maxlen=LOG_LINES)
+        self.last_log_id = 0
+        self._log_lock = threading.Lock()
 
     def reload(self):
         self.account = Account.get(self.name)
@@ -37,20 +51,8 @@ class Trader:
         return df
 
     def get_portfolio_value_chart(self):
-        df = self.get_portfolio_value_df()
-        fig = px.line(df, x="datetime", y="value")
-        margin = dict(l=40, r=20, t=20, b=40)
-        fig.update_layout(
-            height=300,
-            margin=margin,
-            xaxis_title=None,
-            yaxis_title=None,
-            paper_bgcolor="#bbb",
-            plot_bgcolor="#dde",
-        )
-        fig.update_xaxes(tickformat="%m/%d", tickangle=45, tickfont=dict(size=8))
-        fig.update_yaxes(tickfont=dict(size=8), tickformat=",.0f")
-        return fig
+        # cached per trader; only snapshots newer than the last refresh are read and appended
+        return self.chart.figure()
 
     def get_holdings_df(self) -> pd.DataFrame:
         """Convert holdings to DataFrame for display"""
@@ -80,17 +82,50 @@ class Trader:
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
     def get_logs(self, previous=None) -> str | dict:
-        logs = read_log(self.name, last_n=13)
-        response = ""
-        for log in logs:
-            timestamp, type, message = log
-            color = mapper.get(type, Color.WHITE).value
-            response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
+        # only rows newer than the last one seen are read; the rendered lines are kept between ticks
+        with self._log_lock:
+            for log_id, timestamp, type, message in read_log_since(self.name, self.last_log_id, last_n=LOG_LINES):
+                color = mapper.get(type, Color.WHITE).value
+                self.log_lines.append(f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>")
+                self.last_log_id = log_id
+            response = "".join(self.log_lines)
         response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
         if response != previous:
             return response
         return gr.update()
 
+    def get_metrics(self) -> str:
+        """The last run's and recent average cost: time, LLM turns, tokens, tool calls"""
+        runs = read_metrics(self.name, METRICS_RUNS)
+        if not runs:
+            return "<div style='text-align: center;color:#888;'>No runs measured yet</div>"
+        last = runs[0]
+        slowest = max(last["tools"].items(), key=lambda tool: tool[1][1], default=None)
+        average_seconds = sum(run["seconds"] for run in runs) / len(runs)
+        average_tokens = sum(run["input_tokens"] + run["output_tokens"] for run in runs) / len(runs)
+        return (
+            "<div style='text-align: center;font-size:14px;'>"
+            f"Last run: {last['seconds']:.0f}s, {last['llm_turns']} turns, "
+            f"{last['input_tokens'] + last['output_tokens']:,} tokens, {last['tool_calls']} tool calls"
+            + (f", slowest tool {slowest[0]} ({slowest[1][1]:.0f}s)" if slowest else "")
+            + f"<br/><span style='color:#888;'>Last {len(runs)} runs: {average_seconds:.0f}s and {average_tokens:,.0f} tokens on average</span>"
+            "</div>"
+        )
+
+
+def get_metrics_summary_df() -> pd.DataFrame:
+    """Per trader and model over the last METRICS_DAYS: which combination is expensive and slow"""
+    since = (datetime.now(timezone.utc) - timedelta(days=METRICS_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    rows = [
+        [
+            row["name"].title(), row["model"], row["runs"], round(row["avg_seconds"]), round(row["max_seconds"]),
+            round(row["avg_llm_turns"], 1), round(row["avg_input_tokens"] + row["avg_output_tokens"]),
+            row["total_tokens"], round(row["avg_tool_calls"], 1), row["errors"],
+        ]
+        for row in read_metrics_summary(since)
+    ]
+    return pd.DataFrame(rows, columns=METRICS_SUMMARY_HEADERS)
+
 
 class TraderView:
     def __init__(self, trader: Trader):
@@ -99,6 +134,8 @@ class TraderView:
         self.chart = None
         self.holdings_table = None
         self.transactions_table = None
+        self.metrics = None
+        self.metrics_summary = None  # the floor-wide table, shared by every view
 
     def make_ui(self):
         with gr.Column():
@@ -111,6 +148,8 @@ class TraderView:
                 )
             with gr.Row(variant="panel"):
                 self.log = gr.HTML(self.trader.get_logs)
+            with gr.Row():
+                self.metrics = gr.HTML(self.trader.get_metrics)
             with gr.Row():
                 self.holdings_table = gr.Dataframe(
                     value=self.trader.get_holdings_df,
@@ -130,27 +169,11 @@ class TraderView:
                     elem_classes=["dataframe-fix"],
                 )
 
-        timer = gr.Timer(value=120)
-        timer.tick(
-            fn=self.refresh,
-            inputs=[],
-            outputs=[
-                self.portfolio_value,
-                self.chart,
-                self.holdings_table,
-                self.transactions_table,
-            ],
-            show_progress="hidden",
-            queue=False,
-        )
-        log_timer = gr.Timer(value=0.5)
-        log_timer.tick(
-            fn=self.trader.get_logs,
-            inputs=[self.log],
-            outputs=[self.log],
-            show_progress="hidden",
-            queue=False,
-        )
+    def outputs(self) -> list:
+        return [
+            self.portfolio_value, self.chart, self.holdings_table, self.transactions_table, self.log,
+            self.metrics, self.metrics_summary,
+        ]
 
     def refresh(self):
         self.trader.reload()
@@ -161,6 +184,25 @@ class TraderView:
             self.trader.get_transactions_df(),
         )
 
+    def updates(self, kinds: set[str]) -> tuple:
+        account = self.refresh() if EVENT_ACCOUNT in kinds else (gr.update(),) * 4
+        log = self.trader.get_logs() if EVENT_LOG in kinds else gr.update()
+        metrics = (
+            (self.trader.get_metrics(), get_metrics_summary_df())
+            if EVENT_METRICS in kinds else (gr.update(), gr.update())
+        )
+        return (*account, log, *metrics)
+
+    async def stream(self):
+        # pushed by the event watcher instead of polled: nothing is read or priced until this trader changes.
+        # An async generator, so an idle stream waits on the event loop rather than holding one of
+        # gradio's worker threads; only the reads after a change borrow a thread, briefly.
+        async for kinds in get_watcher().alisten(self.trader.name):
+            if not kinds:
+                yield (gr.update(),) * 7  # keepalive
+                continue
+            yield await asyncio.to_thread(self.updates, kinds)
+
 
 # Main UI construction
 def create_ui():
@@ -178,6 +220,23 @@ def create_ui():
         with gr.Row():
             for trader_view in trader_views:
                 trader_view.make_ui()
+        with gr.Row():
+            metrics_summary = gr.Dataframe(
+                value=get_metrics_summary_df,
+                label=f"Cost per trader and model, last {METRICS_DAYS} days",
+                headers=METRICS_SUMMARY_HEADERS,
+                max_height=300,
+                elem_classes=["dataframe-fix"],
+            )
+        for trader_view in trader_views:
+            trader_view.metrics_summary = metrics_summary
+            # one long-lived streaming event per trader per browser tab
+            ui.load(
+                trader_view.stream,
+                outputs=trader_view.outputs(),
+                show_progress="hidden",
+                concurrency_limit=None,
+            )
 
     return ui
 
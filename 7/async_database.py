@@ -0,0 +1,275 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import aiosqlite
+import database
+from database import (
+    transaction_dict,
+    aggregates_params,
+    holding_rows,
+    lot_rows,
+    position_rows,
+    account_from_rows,
+    BUSY_TIMEOUT_MS,
+    STATEMENT_CACHE_SIZE,
+    UPSERT_ACCOUNT_SQL,
+    UPDATE_ACCOUNT_VERSIONED_SQL,
+    UPDATE_BALANCE_VERSIONED_SQL,
+    UPDATE_AGGREGATES_SQL,
+    SELECT_ACCOUNT_SQL,
+    DELETE_ACCOUNT_HISTORY_SQL,
+    SELECT_HOLDINGS_SQL,
+    DELETE_HOLDINGS_SQL,
+    UPSERT_HOLDING_SQL,
+    DELETE_HOLDING_SQL,
+    SELECT_LOTS_SQL,
+    INSERT_LOT_SQL,
+    DELETE_SYMBOL_LOTS_SQL,
+    INSERT_TRANSACTION_SQL,
+    SELECT_TRANSACTIONS_SQL,
+    SELECT_RECENT_TRANSACTIONS_SQL,
+    SELECT_ACCOUNT_VERSION_SQL,
+    INSERT_SNAPSHOT_SQL,
+    SELECT_SNAPSHOTS_SQL,
+    INSERT_LOG_SQL,
+    SELECT_LOG_SQL,
+    UPSERT_MARKET_SQL,
+    SELECT_MARKET_SQL,
+    INSERT_EVENT_SQL,
+    EVENT_ACCOUNT,
+    EVENT_LOG,
+    StaleAccountError,
+)
+
+
+## async twin of database.py for the MCP servers: same tables and SQL, but on aiosqlite
+## so a slow query never blocks the event loop. Tables are created by database.get_connection().
+
+POOL_SIZE = 4  # connections per event loop; WAL lets the readers overlap with one writer
+
+_pool: asyncio.Queue | None = None
+_pool_loop: asyncio.AbstractEventLoop | None = None
+_pool_path: str | None = None
+_opened: list[aiosqlite.Connection] = []
+_reserved = 0  # connections opened or being opened for the current pool
+# the connection of the transaction this task is inside, so nested connection()/transaction() join it
+_current: ContextVar[aiosqlite.Connection | None] = ContextVar('current_transaction', default=None)
+
+
+async def _connect(path: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        uri=path.startswith('file:'),
+    )
+    await conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    await conn.execute('PRAGMA journal_mode = WAL')
+    await conn.execute('PRAGMA synchronous = NORMAL')
+    await conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+def _get_pool() -> asyncio.Queue:
+    global _pool, _pool_loop, _pool_path, _reserved
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop or _pool_path != database.DB:
+        # connections are opened lazily, the queue only holds the ones not in use
+        _pool = asyncio.Queue()
+        _pool_loop = loop
+        _pool_path = database.DB
+        database.get_connection()  # creates the tables on first use of this database
+        # the old loop's (or old database's) connections: stop() closes each one and ends its worker
+        # thread without awaiting anything, so it works even when their loop is gone
+        for conn in _opened:
+            conn.stop()
+        _opened.clear()
+        _reserved = 0
+    return _pool
+
+
+@asynccontextmanager
+async def connection():
+    ''' Borrow a pooled aiosqlite connection for the duration of the block '''
+    global _reserved
+    if (current := _current.get()) is not None:
+        yield current
+        return
+    pool = _get_pool()
+    if pool.empty() and _reserved < POOL_SIZE:
+        _reserved += 1
+        try:
+            conn = await _connect(database.DB)
+        except BaseException:
+            _reserved -= 1  # give the slot back, or enough failed connects would leave pool.get() waiting forever
+            raise
+        _opened.append(conn)
+    else:
+        conn = await pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put_nowait(conn)
+
+
+@asynccontextmanager
+async def transaction():
+    ''' Borrow a connection and run the block in one BEGIN IMMEDIATE transaction; nested use joins it '''
+    if (current := _current.get()) is not None:
+        yield current
+        return
+    async with connection() as conn:
+        await conn.execute('BEGIN IMMEDIATE')
+        token = _current.set(conn)
+        try:
+            yield conn
+        except BaseException:
+            await conn.rollback()
+            raise
+        finally:
+            _current.reset(token)
+        await conn.commit()
+
+
+async def close_connections() -> None:
+    global _pool, _reserved
+    for conn in _opened:
+        await conn.close()
+    _opened.clear()
+    _reserved = 0
+    _pool = None
+
+
+async def write_account(name, account_dict):
+    ''' Async twin of database.write_account '''
+    name = name.lower()
+    async with transaction() as conn:
+        for statement in DELETE_ACCOUNT_HISTORY_SQL:
+            await conn.execute(statement, (name,))
+        await conn.execute(UPSERT_ACCOUNT_SQL, (name, account_dict['balance'], account_dict['strategy']))
+        await conn.execute(UPDATE_AGGREGATES_SQL, aggregates_params(name, account_dict))
+        await conn.executemany(UPSERT_HOLDING_SQL, holding_rows(name, account_dict['holdings'], account_dict.get('cost_basis')))
+        await conn.executemany(INSERT_LOT_SQL, lot_rows(name, account_dict.get('lots', {})))
+        await conn.executemany(INSERT_TRANSACTION_SQL, [
+            (name, t['symbol'], t['quantity'], t['price'], t['timestamp'], t['rationale'])
+            for t in account_dict['transactions']
+        ])
+        await conn.executemany(INSERT_SNAPSHOT_SQL, [
+            (name, dt, value) for dt, value in account_dict['portfolio_value_time_series']
+        ])
+        await conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+
+
+async def write_account_state(name: str, balance: float, strategy: str, holdings: dict[str, int],
+                              cost_basis: dict[str, float] | None = None, version: int | None = None) -> None:
+    ''' Async twin of database.write_account_state '''
+    name = name.lower()
+    async with transaction() as conn:
+        if version is None:
+            await conn.execute(UPSERT_ACCOUNT_SQL, (name, balance, strategy))
+        else:
+            cursor = await conn.execute(UPDATE_ACCOUNT_VERSIONED_SQL, (balance, strategy, name, version))
+            if not cursor.rowcount:
+                raise StaleAccountError(name)
+        await conn.execute(DELETE_HOLDINGS_SQL, (name,))
+        await conn.executemany(UPSERT_HOLDING_SQL, holding_rows(name, holdings, cost_basis))
+        await conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+
+
+async def record_trade(name: str, balance: float, symbol: str, holding: int, trade: dict,
+                       aggregates: dict, cost: float, lots: list[tuple[int, float]], version: int, message: str) -> None:
+    ''' Async twin of database.record_trade '''
+    await record_trades(name, balance, aggregates, {symbol: (holding, cost, lots)}, [trade], [message], version)
+
+
+async def record_trades(name: str, balance: float, aggregates: dict, positions: dict[str, tuple[int, float, list]],
+                        trades: list[dict], messages: list[str], version: int) -> None:
+    ''' Async twin of database.record_trades '''
+    name = name.lower()
+    upserts, deletes, lots = position_rows(name, positions)
+    async with transaction() as conn:
+        cursor = await conn.execute(UPDATE_BALANCE_VERSIONED_SQL, (balance, name, version))
+        if not cursor.rowcount:
+            raise StaleAccountError(name)
+        await conn.execute(UPDATE_AGGREGATES_SQL, aggregates_params(name, aggregates))
+        await conn.executemany(UPSERT_HOLDING_SQL, upserts)
+        await conn.executemany(DELETE_HOLDING_SQL, deletes)
+        await conn.executemany(DELETE_SYMBOL_LOTS_SQL, [(name, symbol) for symbol in positions])
+        await conn.executemany(INSERT_LOT_SQL, lots)
+        await conn.executemany(INSERT_TRANSACTION_SQL, [
+            (name, t['symbol'], t['quantity'], t['price'], t['timestamp'], t['rationale']) for t in trades
+        ])
+        await conn.executemany(INSERT_LOG_SQL, [(name, 'account', message) for message in messages])
+        await conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+        await conn.execute(INSERT_EVENT_SQL, (name, EVENT_LOG))
+
+
+async def write_portfolio_snapshot(name: str, timestamp: str, value: float) -> None:
+    async with transaction() as conn:
+        await conn.execute(INSERT_SNAPSHOT_SQL, (name.lower(), timestamp, value))
+        await conn.execute(INSERT_EVENT_SQL, (name.lower(), EVENT_ACCOUNT))
+
+
+async def read_account(name, with_history=True):
+    ''' Async twin of database.read_account '''
+    name = name.lower()
+    async with connection() as conn:
+        async with conn.execute(SELECT_ACCOUNT_SQL, (name,)) as cursor:
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        async with conn.execute(SELECT_HOLDINGS_SQL, (name,)) as cursor:
+            holdings = await cursor.fetchall()
+        async with conn.execute(SELECT_LOTS_SQL, (name,)) as cursor:
+            lots = await cursor.fetchall()
+        account = account_from_rows(name, row, holdings, lots)
+        if with_history:
+            async with conn.execute(SELECT_TRANSACTIONS_SQL, (name,)) as cursor:
+                account["transactions"] = [transaction_dict(*row) for row in await cursor.fetchall()]
+            async with conn.execute(SELECT_SNAPSHOTS_SQL, (name,)) as cursor:
+                account["portfolio_value_time_series"] = list(await cursor.fetchall())
+    return account
+
+
+async def read_recent_transactions(name: str, limit: int = 10) -> list[dict]:
+    ''' Async twin of database.read_recent_transactions '''
+    async with connection() as conn:
+        async with conn.execute(SELECT_RECENT_TRANSACTIONS_SQL, (name.lower(), limit)) as cursor:
+            return [transaction_dict(*row[1:]) for row in await cursor.fetchall()]
+
+
+async def read_account_version(name: str) -> int:
+    ''' Async twin of database.read_account_version '''
+    async with connection() as conn:
+        async with conn.execute(SELECT_ACCOUNT_VERSION_SQL, (name.lower(),)) as cursor:
+            return (await cursor.fetchone())[0]
+
+
+async def write_log(name: str, type: str, message: str):
+    ''' Async twin of database.write_log '''
+    async with transaction() as conn:
+        await conn.execute(INSERT_LOG_SQL, (name.lower(), type, message))
+        await conn.execute(INSERT_EVENT_SQL, (name.lower(), EVENT_LOG))
+
+
+async def read_log(name: str, last_n=10):
+    ''' Async twin of database.read_log '''
+    async with connection() as conn:
+        async with conn.execute(SELECT_LOG_SQL, (name.lower(), last_n)) as cursor:
+            rows = await cursor.fetchall()
+    return list(rows)[::-1]
+
+
+async def write_market(date: str, data: dict) -> None:
+    data_json = json.dumps(data)
+    async with transaction() as conn:
+        await conn.execute(UPSERT_MARKET_SQL, (date, data_json))
+
+
+async def read_market(date: str) -> dict | None:
+    async with connection() as conn:
+        async with conn.execute(SELECT_MARKET_SQL, (date,)) as cursor:
+            row = await cursor.fetchone()
+    return json.loads(row[0]) if row else None
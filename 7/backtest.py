@@ -0,0 +1,371 @@
+"""
+Replay historical prices through a simulated clock and trade them with a strategy, offline.
+
+Bars come from the daily snapshot files in market_data/ (what the live floor saw each day) or
+from a CSV of daily or minute bars (timestamp,symbol,close). For every cycle the clock is set to
+the bar's time, get_share_price / get_share_prices answer from the bar and datetime.now() in
+accounts.py and templates.py returns the simulated time, so the strategy trades through the
+real Account code against a throwaway database in a temp directory. The equity curve is valued afterwards in one
+NumPy pass over the whole replay rather than once per cycle.
+
+    uv run backtest.py --csv bars.csv --strategy momentum --every 60
+    uv run backtest.py --start 2025-01-01 --strategy buy_and_hold --symbols AAPL MSFT NVDA
+    MCP_TRANSPORT=inprocess uv run backtest.py --strategy trader --trader Sam   # the LLM trader itself
+"""
+import argparse
+import asyncio
+import csv
+import inspect
+import math
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+import numpy as np
+
+import accounts
+import async_database
+import database
+import market
+import templates
+from accounts import Account, Order, INITIAL_BALANCE, SPREAD
+from market_snapshot import SNAPSHOT_DIR, read_snapshot
+
+NAME = "backtest"
+SNAPSHOT_OPEN = "09:30:00"  # the live floor sees a day's snapshot (the prior close) from the open on
+
+
+class Bars:
+    '''
+    Closing prices as a (time, symbol) matrix, forward-filled; 0.0 before a symbol's first bar,
+    which is also what market.get_share_price returns for a symbol it doesn't know.
+    '''
+
+    def __init__(self, times: list[datetime], symbols: list[str], closes: np.ndarray):
+        self.times = times
+        self.symbols = symbols
+        self.column = {symbol: i for i, symbol in enumerate(symbols)}
+        self.closes = forward_fill(closes)
+        self.times64 = np.array(times, dtype="datetime64[s]")
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[datetime, str, float]]) -> 'Bars':
+        times = sorted({time for time, _, _ in rows})
+        symbols = sorted({symbol for _, symbol, _ in rows})
+        row = {time: i for i, time in enumerate(times)}
+        column = {symbol: i for i, symbol in enumerate(symbols)}
+        closes = np.full((len(times), len(symbols)), np.nan)
+        for time, symbol, close in rows:
+            closes[row[time], column[symbol]] = close
+        return cls(times, symbols, closes)
+
+    @classmethod
+    def from_csv(cls, path: str, symbols: list[str] | None = None) -> 'Bars':
+        ''' Long-format bars: a header with timestamp, symbol and close columns, any bar size '''
+        wanted = set(symbols or [])
+        with open(path, newline="") as f:
+            rows = [
+                (datetime.fromisoformat(row["timestamp"]), row["symbol"], float(row["close"]))
+                for row in csv.DictReader(f)
+                if not wanted or row["symbol"] in wanted
+            ]
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_snapshots(cls, symbols: list[str], start: str = "", end: str = "9999") -> 'Bars':
+        ''' Daily bars from the market_data/ snapshot files dated start..end (inclusive) '''
+        dates = sorted(
+            name.removesuffix(".snap") for name in os.listdir(SNAPSHOT_DIR)
+            if name.endswith(".snap") and start <= name.removesuffix(".snap") <= end
+        ) if os.path.isdir(SNAPSHOT_DIR) else []
+        rows = []
+        for date in dates:
+            snapshot = read_snapshot(date)
+            time = datetime.fromisoformat(f"{date} {SNAPSHOT_OPEN}")
+            rows += [(time, symbol, price) for symbol in symbols if (price := snapshot.get(symbol))]
+        return cls.from_rows(rows)
+
+    def price_at(self, i: int, symbol: str) -> float:
+        column = self.column.get(symbol)
+        return float(self.closes[i, column]) if column is not None else 0.0
+
+
+def forward_fill(closes: np.ndarray) -> np.ndarray:
+    ''' Carry each symbol's last close over the bars it has none; leading gaps become 0.0 '''
+    rows = np.where(np.isnan(closes), 0, np.arange(len(closes))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = closes[rows, np.arange(closes.shape[1])]
+    return np.nan_to_num(filled, nan=0.0)
+
+
+class SimulatedClock:
+    ''' The replay's current bar; prices and datetime.now() both read it '''
+
+    def __init__(self, bars: Bars):
+        self.bars = bars
+        self.index = 0
+        clock = self
+
+        class SimulatedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                now = clock.now
+                return now.replace(tzinfo=tz) if tz else now
+
+        self.datetime = SimulatedDatetime
+
+    @property
+    def now(self) -> datetime:
+        return self.bars.times[self.index]
+
+    def get_share_price(self, symbol) -> float:
+        return self.bars.price_at(self.index, symbol)
+
+    def get_share_prices(self, symbols) -> dict[str, float]:
+        return {symbol: self.bars.price_at(self.index, symbol) for symbol in dict.fromkeys(symbols)}
+
+
+@contextmanager
+def simulated(clock: SimulatedClock, database_path: str | None = None):
+    '''
+    Point prices, datetime.now(), the database and the researchers' memory at the replay for the
+    duration. Without a database_path the database is a file in a temp directory that is removed
+    on exit, so read the results inside the block.
+    '''
+    scratch = tempfile.TemporaryDirectory(prefix="backtest-")
+    patches = [(module, "get_share_price", clock.get_share_price) for module in (accounts, market)]
+    patches += [(module, "get_share_prices", clock.get_share_prices) for module in (accounts, market)]
+    patches += [(accounts, "datetime", clock.datetime), (templates, "datetime", clock.datetime)]
+    if "market_server" in sys.modules:  # the trader strategy mounts it in-process
+        patches.append((sys.modules["market_server"], "get_share_price", clock.get_share_price))
+    if "mcp_params" in sys.modules:  # keep what a simulated researcher memorises out of ./memory
+        patches.append((sys.modules["mcp_params"], "MEMORY_DIR", scratch.name))
+    originals = [(module, attribute, getattr(module, attribute)) for module, attribute, _ in patches]
+    previous_database = database.DB
+    for module, attribute, value in patches:
+        setattr(module, attribute, value)
+    database.use_database(database_path or os.path.join(scratch.name, "backtest.db"))
+    try:
+        yield
+    finally:
+        database.use_database(previous_database)
+        for module, attribute, value in originals:
+            setattr(module, attribute, value)
+        scratch.cleanup()
+
+
+@dataclass
+class MarketView:
+    ''' What a strategy may look at on a cycle: the bars up to and including now, never after '''
+    bars: Bars
+    index: int
+
+    @property
+    def now(self) -> datetime:
+        return self.bars.times[self.index]
+
+    @property
+    def symbols(self) -> list[str]:
+        return self.bars.symbols
+
+    @property
+    def history(self) -> np.ndarray:
+        return self.bars.closes[:self.index + 1]
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.bars.closes[self.index]
+
+
+# a strategy returns the orders to place this cycle (or trades through the account itself and returns nothing)
+Strategy = Callable[[Account, MarketView], list[Order | dict] | None | Awaitable[list[Order | dict] | None]]
+
+
+def rebalance_orders(account: Account, view: MarketView, weights: np.ndarray, rationale: str) -> list[dict]:
+    ''' Sells then buys that move the account to the target weight per symbol '''
+    prices = view.prices
+    held = np.array([account.holdings.get(symbol, 0) for symbol in view.symbols])
+    value = account.balance + held @ prices
+    priced = prices > 0
+    target = np.zeros_like(held)
+    target[priced] = np.floor(weights[priced] * value / (prices[priced] * (1 + SPREAD)))
+    change = target - held
+    orders = [
+        {"side": "sell", "symbol": view.symbols[i], "quantity": int(-change[i]), "rationale": rationale}
+        for i in np.flatnonzero(change < 0)
+    ]
+    return orders + [
+        {"side": "buy", "symbol": view.symbols[i], "quantity": int(change[i]), "rationale": rationale}
+        for i in np.flatnonzero(change > 0)
+    ]
+
+
+def buy_and_hold(account: Account, view: MarketView) -> list[dict]:
+    ''' Split the cash equally across every priced symbol on the first cycle, then sit still '''
+    if account.holdings:
+        return []
+    priced = view.prices > 0
+    weights = priced / max(priced.sum(), 1)
+    return rebalance_orders(account, view, weights, "buy and hold")
+
+
+def momentum(lookback: int = 20, top: int = 3) -> Strategy:
+    ''' Hold the top symbols by return over the last lookback bars, equally weighted '''
+    def strategy(account: Account, view: MarketView) -> list[dict]:
+        history = view.history
+        if len(history) <= lookback:
+            return []
+        then, now = history[-lookback - 1], history[-1]
+        returns = np.where((then > 0) & (now > 0), now / np.where(then > 0, then, 1) - 1, -np.inf)
+        winners = [i for i in np.argsort(returns)[::-1][:top] if np.isfinite(returns[i])]
+        weights = np.zeros(len(view.symbols))
+        weights[winners] = 1 / top
+        return rebalance_orders(account, view, weights, f"{lookback}-bar momentum")
+    return strategy
+
+
+class LocalAccounts:
+    ''' The reads Trader makes through AccountsClient, answered in-process from the replay's accounts '''
+
+    async def read_summary_resource(self, name):
+        return await Account.aget_summary(name)
+
+    async def read_strategy_resource(self, name):
+        return await (await Account.aget(name.lower(), lazy=True)).aget_strategy()
+
+
+def trader_strategy(name: str, lastname: str = "Trader", model_name: str = "gpt-4o-mini") -> Strategy:
+    '''
+    The live LLM Trader as a strategy: it trades through its own tools, so those have to run in
+    this process (MCP_TRANSPORT=inprocess) to see the simulated prices and database. Its research
+    tools still browse today's web, so expect some look-ahead.
+    '''
+    import mcp_params
+    if mcp_params.mcp_transport != "inprocess" or mcp_params.market_mcp != mcp_params.local_server("market_server"):
+        raise ValueError("The trader strategy needs MCP_TRANSPORT=inprocess and the local market_server (no paid Polygon plan)")
+    import market_server  # imported now so simulated() patches its price lookup too
+    from traders import Trader
+    trader = Trader(name, lastname, model_name, accounts_client=LocalAccounts())
+    live = database.read_account(name.lower(), with_history=False)
+
+    async def strategy(account: Account, view: MarketView) -> None:
+        if error := await trader.run():
+            print(f"{view.now}: {error}")
+    strategy.description = live["strategy"] if live else f"backtest of {name}"
+    return strategy
+
+
+def equity_curve(bars: Bars, transactions: list[dict]) -> np.ndarray:
+    '''
+    Portfolio value at every bar, from the transactions alone: holdings are the running sum of
+    the trades, cash the running sum of what they cost, valued against the whole price matrix at once.
+    '''
+    deltas = np.zeros(bars.closes.shape)
+    cash = np.zeros(len(bars.times))
+    if transactions:
+        times = np.array([t["timestamp"] for t in transactions], dtype="datetime64[s]")
+        rows = np.searchsorted(bars.times64, times, side="right") - 1
+        columns = np.array([bars.column[t["symbol"]] for t in transactions])
+        quantities = np.array([t["quantity"] for t in transactions], dtype=float)
+        np.add.at(deltas, (rows, columns), quantities)
+        np.add.at(cash, rows, -quantities * np.array([t["price"] for t in transactions]))
+    holdings = np.cumsum(deltas, axis=0)
+    return INITIAL_BALANCE + np.cumsum(cash) + (holdings * bars.closes).sum(axis=1)
+
+
+def metrics(bars: Bars, values: np.ndarray) -> dict:
+    returns = np.diff(values) / values[:-1]
+    years = (bars.times[-1] - bars.times[0]).total_seconds() / (365.25 * 86400)
+    periods_per_year = len(returns) / years if years > 0 else 0
+    volatility = returns.std() if len(returns) else 0.0
+    return {
+        "final_value": round(float(values[-1]), 2),
+        "total_return": round(float(values[-1] / INITIAL_BALANCE - 1), 4),
+        "max_drawdown": round(float((values / np.maximum.accumulate(values) - 1).min()), 4),
+        "sharpe": round(float(returns.mean() / volatility * math.sqrt(periods_per_year)), 2) if volatility > 0 else 0.0,
+    }
+
+
+@dataclass
+class BacktestResult:
+    times: list[datetime]
+    values: np.ndarray
+    transactions: list[dict]
+    cycles: int
+    rejected: int
+    metrics: dict
+
+
+def run_backtest(
+    bars: Bars,
+    strategy: Strategy,
+    every: int = 1,
+    name: str = NAME,
+    database_path: str | None = None,
+) -> BacktestResult:
+    ''' Run the strategy on every `every`-th bar and value the result at every bar '''
+    if not bars.times:
+        raise ValueError("No bars to replay")
+    clock = SimulatedClock(bars)
+    cycles = rejected = 0
+    with simulated(clock, database_path):
+        account = Account.get(name, lazy=True)
+        account.reset(getattr(strategy, "description", f"backtest of {getattr(strategy, '__name__', 'a strategy')}"))
+        loop = asyncio.new_event_loop()
+        try:
+            for clock.index in range(0, len(bars.times), every):
+                orders = strategy(account, MarketView(bars, clock.index))
+                if inspect.isawaitable(orders):
+                    orders = loop.run_until_complete(orders)
+                    account = Account.get(name, lazy=True)  # the strategy traded on its own copies
+                cycles += 1
+                if not orders:
+                    continue
+                try:
+                    account.place_orders(orders)
+                except ValueError as e:
+                    rejected += 1
+                    print(f"{clock.now}: {e}")
+        finally:
+            loop.run_until_complete(async_database.close_connections())
+            loop.close()
+        transactions = account.list_transactions()
+    values = equity_curve(bars, transactions)
+    return BacktestResult(bars.times, values, transactions, cycles, rejected, metrics(bars, values))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", help="bars as timestamp,symbol,close rows; default: the market_data/ snapshots")
+    parser.add_argument("--symbols", nargs="+", default=["AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA"])
+    parser.add_argument("--start", default="", help="first snapshot date, YYYY-MM-DD")
+    parser.add_argument("--end", default="9999", help="last snapshot date, YYYY-MM-DD")
+    parser.add_argument("--strategy", choices=["buy_and_hold", "momentum", "trader"], default="momentum")
+    parser.add_argument("--lookback", type=int, default=20, help="momentum lookback in bars")
+    parser.add_argument("--top", type=int, default=3, help="momentum: how many symbols to hold")
+    parser.add_argument("--trader", default="Sam", help="trader strategy: whose prompt and account name to use")
+    parser.add_argument("--every", type=int, default=1, help="run the strategy every N bars")
+    parser.add_argument("--database", help="keep the simulated accounts in this file; default: a temp file removed afterwards")
+    args = parser.parse_args()
+
+    bars = Bars.from_csv(args.csv, args.symbols) if args.csv else Bars.from_snapshots(args.symbols, args.start, args.end)
+    name = NAME
+    if args.strategy == "buy_and_hold":
+        strategy = buy_and_hold
+    elif args.strategy == "momentum":
+        strategy = momentum(args.lookback, args.top)
+    else:
+        strategy, name = trader_strategy(args.trader), args.trader
+    print(f"Replaying {len(bars.times)} bars of {len(bars.symbols)} symbols, {bars.times[0]} to {bars.times[-1]}" if bars.times else "No bars found")
+    result = run_backtest(bars, strategy, args.every, name, args.database)
+    print(f"{result.cycles} cycles, {len(result.transactions)} trades, {result.rejected} rejected batches")
+    for key, value in result.metrics.items():
+        print(f"{key:>13}: {value}")
+
+
+if __name__ == "__main__":
+    main()
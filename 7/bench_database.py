@@ -0,0 +1,97 @@
+"""
+Micro-benchmark: connect-per-call sqlite3 (the old database.py) vs the pooled WAL connection manager.
+
+Every thread plays a trader: write_account + write_log + read_account + read_log per op,
+all against a scratch database so accounts.db is never touched.
+
+    uv run bench_database.py --threads 5 --ops 400
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+
+# the pre-pool accounts table: one JSON blob per account
+LEGACY_CREATE_ACCOUNTS_SQL = 'CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)'
+LEGACY_UPSERT_ACCOUNT_SQL = '''
+    INSERT INTO accounts (name, account)
+    VALUES (?, ?)
+    ON CONFLICT(name) DO UPDATE SET account=excluded.account
+'''
+LEGACY_SELECT_ACCOUNT_SQL = 'SELECT account FROM accounts WHERE name = ?'
+
+
+def legacy_op(path: str, name: str, account: dict) -> None:
+    # the pre-pool implementation: a fresh connection (and rollback-journal fsync) per call
+    with sqlite3.connect(path) as conn:
+        conn.execute(LEGACY_UPSERT_ACCOUNT_SQL, (name, json.dumps(account)))
+    with sqlite3.connect(path) as conn:
+        conn.execute(database.INSERT_LOG_SQL, (name, 'bench', 'legacy op'))
+        conn.commit()
+    with sqlite3.connect(path) as conn:
+        json.loads(conn.execute(LEGACY_SELECT_ACCOUNT_SQL, (name,)).fetchone()[0])
+    with sqlite3.connect(path) as conn:
+        conn.execute(database.SELECT_LOG_SQL, (name, 10)).fetchall()
+
+
+def pooled_op(path: str, name: str, account: dict) -> None:
+    database.write_account(name, account)
+    database.write_log(name, 'bench', 'pooled op')
+    database.read_account(name)
+    database.read_log(name, last_n=10)
+
+
+def run(op, path: str, threads: int, ops: int) -> tuple[float, int]:
+    errors = []
+    account = {"name": "bench", "balance": 10_000.0, "strategy": "", "holdings": {"AAPL": 10},
+               "transactions": [], "portfolio_value_time_series": []}
+
+    def worker(i: int):
+        name = f'trader{i}'
+        for _ in range(ops):
+            try:
+                op(path, name, account)
+            except sqlite3.OperationalError as e:  # "database is locked"
+                errors.append(e)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return threads * ops / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=5, help='concurrent writers (4 traders + dashboard)')
+    parser.add_argument('--ops', type=int, default=400, help='ops per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute(LEGACY_CREATE_ACCOUNTS_SQL)
+            conn.execute(database.CREATE_LOGS_SQL)
+        legacy_rate, legacy_errors = run(legacy_op, legacy_path, args.threads, args.ops)
+
+        database.use_database(os.path.join(tmp, 'pooled.db'))
+        pooled_rate, pooled_errors = run(pooled_op, database.DB, args.threads, args.ops)
+        database.close_connections()
+
+    print(f'{args.threads} threads x {args.ops} ops (write_account + write_log + read_account + read_log)')
+    print(f'  connect-per-call : {legacy_rate:10,.0f} ops/sec  ({legacy_errors} lock errors)')
+    print(f'  pooled WAL       : {pooled_rate:10,.0f} ops/sec  ({pooled_errors} lock errors)')
+    print(f'  speedup          : {pooled_rate / legacy_rate:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
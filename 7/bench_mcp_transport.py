@@ -0,0 +1,78 @@
+"""
+Tool-call latency of our own FastMCP servers over stdio subprocesses vs mounted in-process.
+
+Both modes go through the same MCP client (agents.mcp) and the same tool, so the difference
+is transport only: JSON over a pipe to a child process vs anyio memory streams.
+
+    uv run bench_mcp_transport.py --calls 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import async_database
+import database
+from accounts import Account
+from mcp_inprocess import create_mcp_server
+
+
+def params_for(mode: str, module: str) -> dict:
+    if mode == "inprocess":
+        return {"module": module}
+    # the child opens the same scratch database as this process
+    return {"command": sys.executable, "args": [f"{module}.py"], "env": {**os.environ, "ACCOUNTS_DB": database.DB}}
+
+
+async def bench(mode: str, module: str, tool: str, args: dict, calls: int, concurrency: int) -> dict:
+    server = create_mcp_server(params_for(mode, module), cache_tools_list=True)
+    start = time.perf_counter()
+    async with server:
+        connect = time.perf_counter() - start
+        await server.call_tool(tool, args)  # warm up
+        latencies = []
+
+        async def one():
+            t = time.perf_counter()
+            await server.call_tool(tool, args)
+            latencies.append(time.perf_counter() - t)
+
+        start = time.perf_counter()
+        for i in range(0, calls, concurrency):
+            await asyncio.gather(*[one() for _ in range(min(concurrency, calls - i))])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "connect_ms": connect * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "calls_per_sec": calls / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1, help="tool calls in flight at once")
+    parser.add_argument("--name", default="Ed", help="trader whose balance is read")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # a scratch database, seeded with the account, so accounts.db is never touched
+        database.use_database(os.path.join(tmp, "bench.db"))
+        Account.get(args.name)
+        print(f"accounts_server get_balance x {args.calls} (concurrency {args.concurrency})")
+        for mode in ("stdio", "inprocess"):
+            r = await bench(mode, "accounts_server", "get_balance", {"name": args.name}, args.calls, args.concurrency)
+            print(f"  {mode:9}: connect {r['connect_ms']:7.1f} ms   p50 {r['p50_ms']:6.2f} ms   "
+                  f"p95 {r['p95_ms']:6.2f} ms   {r['calls_per_sec']:8,.0f} calls/sec")
+        await async_database.close_connections()
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+import plotly.graph_objects as go
+from database import read_portfolio_snapshots
+
+
+CHART_POINTS = 500  # most points sent to the browser per chart; longer series are downsampled
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets downsampling: indices of `threshold` points that keep the
+    visual shape of the series (first and last point always kept).
+    '''
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # twice the area of the triangle (point a, candidate, average of the next bucket)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    indices[-1] = n - 1
+    return indices
+
+
+class PortfolioChart:
+    '''
+    Portfolio value chart for one trader, kept between refreshes.
+
+    update() reads only the snapshots added since the last call (by id), so the series is
+    appended to rather than reloaded. The plotly figure is cached on the series length: when
+    nothing was added it is returned as is; while the series fits CHART_POINTS the new points
+    are appended to the existing trace; past that, the trace is re-downsampled with LTTB.
+    '''
+
+    def __init__(self, name: str, max_points: int = CHART_POINTS):
+        self.name = name
+        self.max_points = max_points
+        self.last_id = 0
+        self.times = np.empty(0, dtype='datetime64[s]')
+        self.values = np.empty(0, dtype=np.float64)
+        self._figure: go.Figure | None = None
+        self._figure_len = 0
+        self._lock = threading.Lock()
+
+    def update(self) -> int:
+        ''' Append new snapshots from the database; returns how many were added '''
+        added = 0
+        while rows := read_portfolio_snapshots(self.name, after_id=self.last_id):
+            self.last_id = rows[-1][0]
+            self.times = np.concatenate([self.times, np.array([row[1] for row in rows], dtype='datetime64[s]')])
+            self.values = np.concatenate([self.values, np.array([row[2] for row in rows], dtype=np.float64)])
+            added += len(rows)
+        return added
+
+    def _new_figure(self) -> go.Figure:
+        fig = go.Figure(go.Scatter(x=[], y=[], mode="lines"))
+        margin = dict(l=40, r=20, t=20, b=40)
+        fig.update_layout(
+            height=300,
+            margin=margin,
+            xaxis_title=None,
+            yaxis_title=None,
+            paper_bgcolor="#bbb",
+            plot_bgcolor="#dde",
+        )
+        fig.update_xaxes(tickformat="%m/%d", tickangle=45, tickfont=dict(size=8))
+        fig.update_yaxes(tickfont=dict(size=8), tickformat=",.0f")
+        return fig
+
+    def figure(self) -> go.Figure:
+        with self._lock:
+            self.update()
+            n = len(self.values)
+            if self._figure is not None and n == self._figure_len:
+                return self._figure
+            if self._figure is None:
+                self._figure = self._new_figure()
+                self._figure_len = 0
+            trace = self._figure.data[0]
+            if n <= self.max_points:
+                # append only the new points
+                new = slice(self._figure_len, n)
+                trace.x = tuple(trace.x or ()) + tuple(self.times[new].astype(object))
+                trace.y = tuple(trace.y or ()) + tuple(self.values[new].tolist())
+            else:
+                keep = lttb(self.times.astype(np.int64).astype(np.float64), self.values, self.max_points)
+                trace.x = self.times[keep].astype(object)
+                trace.y = self.values[keep]
+            self._figure_len = n
+            return self._figure
@@ -1,49 +1,658 @@
+import os
 import sqlite3
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
 
 load_dotenv(override=True)
 
-DB = 'accounts.db'
-
-# create tables accounts, logs, market
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            datetime DATETIME,
-            type TEXT,
-            message TEXT
-        )
-    ''')
-
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
+DB = os.getenv('ACCOUNTS_DB') or 'accounts.db'  # set for child processes that must share another database
+
+BUSY_TIMEOUT_MS = 5000       # wait for a competing writer instead of failing with "database is locked"
+STATEMENT_CACHE_SIZE = 256   # prepared statements kept per connection (sqlite3 default is 128)
+
+# kinds of rows in the events table
+EVENT_ACCOUNT = 'account'  # balance, holdings, strategy, transactions or portfolio value changed
+EVENT_LOG = 'log'          # new log rows
+EVENT_METRICS = 'metrics'  # a trader run's metrics row
+
+
+# SQL kept as module constants so every call hands sqlite3 the same string and
+# reuses the prepared statement cached on the pooled connection
+CREATE_ACCOUNTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        name TEXT PRIMARY KEY,
+        balance REAL NOT NULL,
+        strategy TEXT NOT NULL DEFAULT '',
+        version INTEGER NOT NULL DEFAULT 0,
+        net_invested REAL NOT NULL DEFAULT 0,
+        realized_pnl REAL NOT NULL DEFAULT 0,
+        realized_pnl_avg REAL NOT NULL DEFAULT 0,
+        fees REAL NOT NULL DEFAULT 0,
+        aggregates_version INTEGER NOT NULL DEFAULT 0
+    )
+'''
+CREATE_HOLDINGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS holdings (
+        name TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        cost REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (name, symbol)
+    ) WITHOUT ROWID
+'''
+# open FIFO lots (shares still held from each buy), oldest first by id
+CREATE_LOTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS lots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL
+    )
+'''
+CREATE_LOTS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_lots_name_symbol_id ON lots (name, symbol, id)'
+CREATE_TRANSACTIONS_SQL = '''
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL,
+        timestamp TEXT NOT NULL,
+        rationale TEXT NOT NULL
+    )
+'''
+CREATE_TRANSACTIONS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_transactions_name_id ON transactions (name, id)'
+CREATE_SNAPSHOTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        datetime TEXT NOT NULL,
+        value REAL NOT NULL
+    )
+'''
+CREATE_SNAPSHOTS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_portfolio_snapshots_name_id ON portfolio_snapshots (name, id)'
+CREATE_LOGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        datetime DATETIME,
+        type TEXT,
+        message TEXT
+    )
+'''
+# the dashboard reads each trader's newest logs by id; without this it scans every trader's rows
+CREATE_LOGS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_logs_name_id ON logs (name, id)'
+# one row per trader run whose span logs were pruned by log_retention.py
+CREATE_LOG_SUMMARIES_SQL = '''
+    CREATE TABLE IF NOT EXISTS log_summaries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        run TEXT,
+        started DATETIME,
+        ended DATETIME,
+        entries INTEGER,
+        types TEXT,
+        tools TEXT
+    )
+'''
+CREATE_LOG_SUMMARIES_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_log_summaries_name_id ON log_summaries (name, id)'
+# one row per trader run (trace): LLM turns, tokens, tool calls and time, from MetricsTracer in tracers.py
+CREATE_TRADER_METRICS_SQL = '''
+    CREATE TABLE IF NOT EXISTS trader_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        run TEXT,
+        model TEXT,
+        started DATETIME,
+        ended DATETIME,
+        seconds REAL NOT NULL DEFAULT 0,
+        llm_turns INTEGER NOT NULL DEFAULT 0,
+        cached_turns INTEGER NOT NULL DEFAULT 0,
+        llm_seconds REAL NOT NULL DEFAULT 0,
+        input_tokens INTEGER NOT NULL DEFAULT 0,
+        output_tokens INTEGER NOT NULL DEFAULT 0,
+        tool_calls INTEGER NOT NULL DEFAULT 0,
+        tool_seconds REAL NOT NULL DEFAULT 0,
+        errors INTEGER NOT NULL DEFAULT 0,
+        tools TEXT,
+        servers TEXT
+    )
+'''
+CREATE_TRADER_METRICS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_trader_metrics_name_id ON trader_metrics (name, id)'
+# change feed for other processes (the dashboard): one row per committed change, see events.py
+CREATE_EVENTS_SQL = '''
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        kind TEXT,
+        datetime DATETIME DEFAULT (datetime('now'))
+    )
+'''
+CREATE_MARKET_SQL = 'CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)'
+# persisted PriceCache entries, one row per symbol so a miss writes only what it fetched
+CREATE_PRICES_SQL = '''
+    CREATE TABLE IF NOT EXISTS prices (
+        cache TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        price REAL NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (cache, symbol)
+    ) WITHOUT ROWID
+'''
+
+SCHEMA_SQL = [
+    CREATE_ACCOUNTS_SQL,
+    CREATE_HOLDINGS_SQL,
+    CREATE_LOTS_SQL,
+    CREATE_LOTS_INDEX_SQL,
+    CREATE_TRANSACTIONS_SQL,
+    CREATE_TRANSACTIONS_INDEX_SQL,
+    CREATE_SNAPSHOTS_SQL,
+    CREATE_SNAPSHOTS_INDEX_SQL,
+    CREATE_LOGS_SQL,
+    CREATE_LOGS_INDEX_SQL,
+    CREATE_LOG_SUMMARIES_SQL,
+    CREATE_LOG_SUMMARIES_INDEX_SQL,
+    CREATE_TRADER_METRICS_SQL,
+    CREATE_TRADER_METRICS_INDEX_SQL,
+    CREATE_EVENTS_SQL,
+    CREATE_MARKET_SQL,
+    CREATE_PRICES_SQL,
+]
+
+# columns added after a table first shipped: (table, column, declaration), added by init_db when missing
+ADDED_COLUMNS = [
+    ('accounts', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('accounts', 'net_invested', 'REAL NOT NULL DEFAULT 0'),
+    ('accounts', 'realized_pnl', 'REAL NOT NULL DEFAULT 0'),
+    ('accounts', 'realized_pnl_avg', 'REAL NOT NULL DEFAULT 0'),
+    ('accounts', 'fees', 'REAL NOT NULL DEFAULT 0'),
+    ('accounts', 'aggregates_version', 'INTEGER NOT NULL DEFAULT 0'),
+    ('holdings', 'cost', 'REAL NOT NULL DEFAULT 0'),
+]
+
+UPSERT_ACCOUNT_SQL = '''
+    INSERT INTO accounts (name, balance, strategy)
+    VALUES (?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET balance=excluded.balance, strategy=excluded.strategy, version=accounts.version + 1
+'''
+# optimistic concurrency: a write names the version it was computed from and bumps it; 0 rows means someone else wrote first
+UPDATE_ACCOUNT_VERSIONED_SQL = '''
+    UPDATE accounts SET balance = ?, strategy = ?, version = version + 1
+    WHERE name = ? AND version = ?
+'''
+UPDATE_BALANCE_VERSIONED_SQL = 'UPDATE accounts SET balance = ?, version = version + 1 WHERE name = ? AND version = ?'
+SELECT_ACCOUNT_VERSION_SQL = 'SELECT COALESCE(MAX(version), -1) FROM accounts WHERE name = ?'
+SELECT_ACCOUNT_SQL = '''
+    SELECT balance, strategy, version, net_invested, realized_pnl, realized_pnl_avg, fees, aggregates_version
+    FROM accounts WHERE name = ?
+'''
+UPDATE_AGGREGATES_SQL = '''
+    UPDATE accounts
+    SET net_invested = ?, realized_pnl = ?, realized_pnl_avg = ?, fees = ?, aggregates_version = ?
+    WHERE name = ?
+'''
+DELETE_ACCOUNT_HISTORY_SQL = [
+    'DELETE FROM holdings WHERE name = ?',
+    'DELETE FROM lots WHERE name = ?',
+    'DELETE FROM transactions WHERE name = ?',
+    'DELETE FROM portfolio_snapshots WHERE name = ?',
+]
+
+SELECT_HOLDINGS_SQL = 'SELECT symbol, quantity, cost FROM holdings WHERE name = ?'
+DELETE_HOLDINGS_SQL = 'DELETE FROM holdings WHERE name = ?'
+UPSERT_HOLDING_SQL = '''
+    INSERT INTO holdings (name, symbol, quantity, cost)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(name, symbol) DO UPDATE SET quantity=excluded.quantity, cost=excluded.cost
+'''
+UPDATE_HOLDING_COST_SQL = 'UPDATE holdings SET cost = ? WHERE name = ? AND symbol = ?'
+DELETE_HOLDING_SQL = 'DELETE FROM holdings WHERE name = ? AND symbol = ?'
+SELECT_LOTS_SQL = 'SELECT symbol, quantity, price FROM lots WHERE name = ? ORDER BY id'
+INSERT_LOT_SQL = 'INSERT INTO lots (name, symbol, quantity, price) VALUES (?, ?, ?, ?)'
+DELETE_LOTS_SQL = 'DELETE FROM lots WHERE name = ?'
+DELETE_SYMBOL_LOTS_SQL = 'DELETE FROM lots WHERE name = ? AND symbol = ?'
+
+INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+SELECT_TRANSACTIONS_SQL = '''
+    SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+    WHERE name = ?
+    ORDER BY id
+'''
+SELECT_TRANSACTIONS_PAGE_SQL = '''
+    SELECT id, symbol, quantity, price, timestamp, rationale FROM transactions
+    WHERE name = ? AND id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+SELECT_RECENT_TRANSACTIONS_SQL = '''
+    SELECT id, symbol, quantity, price, timestamp, rationale FROM transactions
+    WHERE name = ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+SUM_TRANSACTIONS_SQL = 'SELECT COALESCE(SUM(quantity * price), 0.0) FROM transactions WHERE name = ?'
+
+INSERT_SNAPSHOT_SQL = 'INSERT INTO portfolio_snapshots (name, datetime, value) VALUES (?, ?, ?)'
+SELECT_SNAPSHOTS_SQL = 'SELECT datetime, value FROM portfolio_snapshots WHERE name = ? ORDER BY id'
+SELECT_SNAPSHOTS_PAGE_SQL = '''
+    SELECT id, datetime, value FROM portfolio_snapshots
+    WHERE name = ? AND id > ?
+    ORDER BY id
+    LIMIT ?
+'''
+
+INSERT_LOG_SQL = '''
+    INSERT INTO logs (name, datetime, type, message)
+    VALUES (?, datetime('now'), ?, ?)
+'''
+INSERT_LOG_AT_SQL = '''
+    INSERT INTO logs (name, datetime, type, message)
+    VALUES (?, ?, ?, ?)
+'''
+SELECT_LOG_SQL = '''
+    SELECT datetime, type, message FROM logs
+    WHERE name = ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+SELECT_LOG_SINCE_SQL = '''
+    SELECT id, datetime, type, message FROM logs
+    WHERE name = ? AND id > ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+METRICS_FIELDS = [
+    'name', 'run', 'model', 'started', 'ended', 'seconds', 'llm_turns', 'cached_turns', 'llm_seconds',
+    'input_tokens', 'output_tokens', 'tool_calls', 'tool_seconds', 'errors', 'tools', 'servers',
+]
+INSERT_METRICS_SQL = f'''
+    INSERT INTO trader_metrics ({', '.join(METRICS_FIELDS)})
+    VALUES ({', '.join('?' * len(METRICS_FIELDS))})
+'''
+SELECT_METRICS_SQL = f'''
+    SELECT id, {', '.join(METRICS_FIELDS)} FROM trader_metrics
+    WHERE name = ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+# per trader and model over the runs since a UTC datetime: which combination is expensive and slow
+SELECT_METRICS_SUMMARY_SQL = '''
+    SELECT name, model, COUNT(*), AVG(seconds), MAX(seconds), AVG(llm_turns), AVG(input_tokens),
+           AVG(output_tokens), SUM(input_tokens + output_tokens), AVG(tool_calls), AVG(llm_seconds),
+           AVG(tool_seconds), SUM(errors)
+    FROM trader_metrics
+    WHERE started >= ?
+    GROUP BY name, model
+    ORDER BY SUM(input_tokens + output_tokens) DESC
+'''
+METRICS_SUMMARY_FIELDS = [
+    'name', 'model', 'runs', 'avg_seconds', 'max_seconds', 'avg_llm_turns', 'avg_input_tokens',
+    'avg_output_tokens', 'total_tokens', 'avg_tool_calls', 'avg_llm_seconds', 'avg_tool_seconds', 'errors',
+]
+INSERT_EVENT_SQL = 'INSERT INTO events (name, kind) VALUES (?, ?)'
+SELECT_EVENTS_SQL = 'SELECT id, name, kind FROM events WHERE id > ? ORDER BY id'
+SELECT_LAST_EVENT_ID_SQL = 'SELECT COALESCE(MAX(id), 0) FROM events'
+UPSERT_MARKET_SQL = '''
+    INSERT INTO market (date, data)
+    VALUES (?, ?)
+    ON CONFLICT(date) DO UPDATE SET data=excluded.data
+'''
+SELECT_MARKET_SQL = 'SELECT data FROM market WHERE date = ?'
+UPSERT_PRICE_SQL = '''
+    INSERT INTO prices (cache, symbol, price, fetched_at)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(cache, symbol) DO UPDATE SET price=excluded.price, fetched_at=excluded.fetched_at
+'''
+SELECT_PRICES_SQL = 'SELECT symbol, price, fetched_at FROM prices WHERE cache = ? AND fetched_at >= ?'
+
+
+## connection manager: one long-lived connection per thread instead of sqlite3.connect() per call
+_local = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+# databases whose tables init_db has created since the last close_connections; done on first connection,
+# not at import, so a CLI can point DB at its own file before ./accounts.db is ever opened
+_initialized: set[str] = set()
+_schema_lock = threading.Lock()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,  # autocommit; writes open their own BEGIN IMMEDIATE in transaction()
+        check_same_thread=False,  # only the owning thread uses it, but close_connections() may run elsewhere
+        cached_statements=STATEMENT_CACHE_SIZE,
+        uri=path.startswith('file:'),
+    )
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    # only takes effect on a new, empty database (before WAL is set); lets log retention give pages back
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('PRAGMA journal_mode = WAL')   # readers no longer block the writer (and vice versa)
+    conn.execute('PRAGMA synchronous = NORMAL')  # safe with WAL, skips the fsync on every commit
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    ''' Return the calling thread's pooled connection to DB, opening it on first use '''
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.path != DB:
+        conn = _connect(DB)
+        _local.conn = conn
+        _local.path = DB
+        with _connections_lock:
+            _connections.append(conn)
+        with _schema_lock:
+            if DB not in _initialized:
+                init_db()  # runs on the connection just stored, so it doesn't come back here
+                _initialized.add(DB)
+    return conn
+
+
+@contextmanager
+def transaction():
+    '''
+    Run the enclosed statements in a single write transaction on the pooled connection.
+
+    BEGIN IMMEDIATE takes the write lock up front, so a competing writer waits on
+    busy_timeout rather than failing halfway through. Nested use joins the outer transaction.
+    '''
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
     conn.commit()
 
-## for async operation should use "import aiosqlite"
+
+def close_connections() -> None:
+    ''' Close every pooled connection; threads reconnect lazily on their next call '''
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _initialized.clear()  # an in-memory database is gone once its connections are
+    _local.__dict__.clear()
+
+
+def is_legacy_schema(conn: sqlite3.Connection) -> bool:
+    ''' True when accounts is still the old (name, account JSON) table '''
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(accounts)')]
+    return 'account' in columns
+
+
+def migrate_legacy_accounts(conn: sqlite3.Connection) -> int:
+    '''
+    Convert the old one-JSON-blob-per-account table into the normalized tables.
+
+    The old table is kept as accounts_legacy so nothing is lost. Runs inside the caller's
+    transaction and returns the number of accounts migrated (0 if already migrated).
+    '''
+    if not is_legacy_schema(conn):
+        return 0
+    conn.execute('ALTER TABLE accounts RENAME TO accounts_legacy')
+    for statement in SCHEMA_SQL:
+        conn.execute(statement)
+
+    rows = conn.execute('SELECT name, account FROM accounts_legacy').fetchall()
+    for name, account_json in rows:
+        account = json.loads(account_json)
+        name = name.lower()
+        conn.execute(UPSERT_ACCOUNT_SQL, (name, account['balance'], account.get('strategy', '')))
+        # cost basis is left at 0 with aggregates_version 0; accounts.py replays the history on first load
+        conn.executemany(UPSERT_HOLDING_SQL, [
+            (name, symbol, quantity, 0.0) for symbol, quantity in account.get('holdings', {}).items()
+        ])
+        conn.executemany(INSERT_TRANSACTION_SQL, [
+            (name, t['symbol'], t['quantity'], t['price'], t['timestamp'], t['rationale'])
+            for t in account.get('transactions', [])
+        ])
+        conn.executemany(INSERT_SNAPSHOT_SQL, [
+            (name, dt, value) for dt, value in account.get('portfolio_value_time_series', [])
+        ])
+    return len(rows)
+
+
+def add_missing_columns(conn: sqlite3.Connection) -> None:
+    ''' ALTER TABLE in the ADDED_COLUMNS an older database doesn't have yet '''
+    for table, column, declaration in ADDED_COLUMNS:
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def init_db() -> None:
+    # create tables accounts, holdings, lots, transactions, portfolio_snapshots, logs, log_summaries, market, prices
+    with transaction() as conn:
+        migrate_legacy_accounts(conn)
+        for statement in SCHEMA_SQL:
+            conn.execute(statement)
+        add_missing_columns(conn)
+
+
+def use_database(path: str) -> None:
+    ''' Point the module at another database file (or a file: URI) and create its tables '''
+    global DB
+    close_connections()
+    DB = path
+    get_connection()
+
+
+class StaleAccountError(Exception):
+    ''' A versioned write found the account changed since it was read; reload and redo the change '''
+
+
 def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)  # json dumps = JSON.stringify() 為了fit sql
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account        
-        ''', (name.lower(), json_data))
-
-
-def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+    ''' Replace the whole account - balance, strategy, holdings and history - with account_dict '''
+    name = name.lower()
+    with transaction() as conn:
+        for statement in DELETE_ACCOUNT_HISTORY_SQL:
+            conn.execute(statement, (name,))
+        conn.execute(UPSERT_ACCOUNT_SQL, (name, account_dict['balance'], account_dict['strategy']))
+        conn.execute(UPDATE_AGGREGATES_SQL, aggregates_params(name, account_dict))
+        conn.executemany(UPSERT_HOLDING_SQL, holding_rows(name, account_dict['holdings'], account_dict.get('cost_basis')))
+        conn.executemany(INSERT_LOT_SQL, lot_rows(name, account_dict.get('lots', {})))
+        conn.executemany(INSERT_TRANSACTION_SQL, [
+            (name, t['symbol'], t['quantity'], t['price'], t['timestamp'], t['rationale'])
+            for t in account_dict['transactions']
+        ])
+        conn.executemany(INSERT_SNAPSHOT_SQL, [
+            (name, dt, value) for dt, value in account_dict['portfolio_value_time_series']
+        ])
+        conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+
+
+AGGREGATE_FIELDS = ['net_invested', 'realized_pnl', 'realized_pnl_avg', 'fees', 'aggregates_version']
+
+
+def aggregates_params(name: str, aggregates: dict) -> tuple:
+    ''' UPDATE_AGGREGATES_SQL parameters from a dict holding AGGREGATE_FIELDS (missing ones are 0) '''
+    return (*[aggregates.get(field, 0) for field in AGGREGATE_FIELDS], name)
+
+
+def holding_rows(name: str, holdings: dict[str, int], cost_basis: dict[str, float] | None = None) -> list[tuple]:
+    cost_basis = cost_basis or {}
+    return [(name, symbol, quantity, cost_basis.get(symbol, 0.0)) for symbol, quantity in holdings.items()]
+
+
+def lot_rows(name: str, lots: dict[str, list]) -> list[tuple]:
+    return [(name, symbol, quantity, price) for symbol, symbol_lots in lots.items() for quantity, price in symbol_lots]
+
+
+def account_from_rows(name: str, account_row: tuple, holdings: list[tuple], lots: list[tuple]) -> dict:
+    ''' The Account fields dict (without history) from SELECT_ACCOUNT / SELECT_HOLDINGS / SELECT_LOTS rows '''
+    balance, strategy, version, *aggregates = account_row
+    account = {
+        "name": name,
+        "balance": balance,
+        "strategy": strategy,
+        "version": version,
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "cost_basis": {symbol: cost for symbol, _, cost in holdings},
+        "lots": {},
+        "transactions": [],
+        "portfolio_value_time_series": [],
+        **dict(zip(AGGREGATE_FIELDS, aggregates)),
+    }
+    for symbol, quantity, price in lots:
+        account["lots"].setdefault(symbol, []).append((quantity, price))
+    return account
+
+
+def write_account_state(name: str, balance: float, strategy: str, holdings: dict[str, int],
+                        cost_basis: dict[str, float] | None = None, version: int | None = None) -> None:
+    '''
+    Write balance, strategy and holdings only; history rows are left untouched.
+    With a version, raise StaleAccountError (and write nothing) unless the account is still at it.
+    '''
+    name = name.lower()
+    with transaction() as conn:
+        if version is None:
+            conn.execute(UPSERT_ACCOUNT_SQL, (name, balance, strategy))
+        elif not conn.execute(UPDATE_ACCOUNT_VERSIONED_SQL, (balance, strategy, name, version)).rowcount:
+            raise StaleAccountError(name)
+        conn.execute(DELETE_HOLDINGS_SQL, (name,))
+        conn.executemany(UPSERT_HOLDING_SQL, holding_rows(name, holdings, cost_basis))
+        conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+
+
+def record_trade(name: str, balance: float, symbol: str, holding: int, trade: dict,
+                 aggregates: dict, cost: float, lots: list[tuple[int, float]], version: int, message: str) -> None:
+    '''
+    Persist one trade as a delta: new balance and running totals, the traded symbol's holding,
+    cost basis and open lots, an appended transaction row and its log line, all in one
+    transaction. Raises StaleAccountError, writing nothing, if the account is no longer at version.
+
+    Args:
+        name (str): The account name
+        balance (float): Balance after the trade
+        symbol (str): The traded symbol
+        holding (int): Shares of symbol held after the trade (0 removes the row)
+        trade (dict): The Transaction.model_dump() to append
+        aggregates (dict): AGGREGATE_FIELDS after the trade
+        cost (float): Average-cost basis of the shares of symbol still held
+        lots (list): Open FIFO (quantity, price) lots of symbol, oldest first
+        version (int): The account version the trade was computed from
+        message (str): The 'account' log line for the trade
+    '''
+    record_trades(name, balance, aggregates, {symbol: (holding, cost, lots)}, [trade], [message], version)
+
+
+def position_rows(name: str, positions: dict[str, tuple[int, float, list]]) -> tuple[list, list, list]:
+    ''' (holding upserts, holding deletes, lot inserts) for the traded symbols' new positions '''
+    upserts = [(name, symbol, holding, cost) for symbol, (holding, cost, _) in positions.items() if holding]
+    deletes = [(name, symbol) for symbol, (holding, _, _) in positions.items() if not holding]
+    lots = lot_rows(name, {symbol: symbol_lots for symbol, (_, _, symbol_lots) in positions.items()})
+    return upserts, deletes, lots
+
+
+def record_trades(name: str, balance: float, aggregates: dict, positions: dict[str, tuple[int, float, list]],
+                  trades: list[dict], messages: list[str], version: int) -> None:
+    '''
+    record_trade for several trades at once (a batch of orders), committed together or not at all.
+    positions maps each traded symbol to its (holding, cost, lots) after the last trade.
+    '''
+    name = name.lower()
+    upserts, deletes, lots = position_rows(name, positions)
+    with transaction() as conn:
+        if not conn.execute(UPDATE_BALANCE_VERSIONED_SQL, (balance, name, version)).rowcount:
+            raise StaleAccountError(name)
+        conn.execute(UPDATE_AGGREGATES_SQL, aggregates_params(name, aggregates))
+        conn.executemany(UPSERT_HOLDING_SQL, upserts)
+        conn.executemany(DELETE_HOLDING_SQL, deletes)
+        conn.executemany(DELETE_SYMBOL_LOTS_SQL, [(name, symbol) for symbol in positions])
+        conn.executemany(INSERT_LOT_SQL, lots)
+        conn.executemany(INSERT_TRANSACTION_SQL, [
+            (name, t['symbol'], t['quantity'], t['price'], t['timestamp'], t['rationale']) for t in trades
+        ])
+        conn.executemany(INSERT_LOG_SQL, [(name, 'account', message) for message in messages])
+        conn.execute(INSERT_EVENT_SQL, (name, EVENT_ACCOUNT))
+        conn.execute(INSERT_EVENT_SQL, (name, EVENT_LOG))
+
+
+def write_aggregates(name: str, aggregates: dict, cost_basis: dict[str, float], lots: dict[str, list]) -> None:
+    ''' Store recomputed running totals, per-holding cost basis and open lots (the one-off backfill) '''
+    name = name.lower()
+    with transaction() as conn:
+        conn.execute(UPDATE_AGGREGATES_SQL, aggregates_params(name, aggregates))
+        conn.executemany(UPDATE_HOLDING_COST_SQL, [(cost, name, symbol) for symbol, cost in cost_basis.items()])
+        conn.execute(DELETE_LOTS_SQL, (name,))
+        conn.executemany(INSERT_LOT_SQL, lot_rows(name, lots))
+
+
+def write_portfolio_snapshot(name: str, timestamp: str, value: float) -> None:
+    with transaction() as conn:
+        conn.execute(INSERT_SNAPSHOT_SQL, (name.lower(), timestamp, value))
+        conn.execute(INSERT_EVENT_SQL, (name.lower(), EVENT_ACCOUNT))
+
+
+def transaction_dict(symbol, quantity, price, timestamp, rationale) -> dict:
+    return {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": timestamp, "rationale": rationale}
+
+
+def read_account(name, with_history=True):
+    '''
+    Read an account as the Account fields dict.
+
+    With with_history=False only balance, strategy, running totals, holdings and open lots are
+    read (indexed lookups, independent of history length); transactions and
+    portfolio_value_time_series come back empty.
+    '''
+    name = name.lower()
+    conn = get_connection()
+    row = conn.execute(SELECT_ACCOUNT_SQL, (name,)).fetchone()
+    if not row:
+        return None
+    holdings = conn.execute(SELECT_HOLDINGS_SQL, (name,)).fetchall()
+    lots = conn.execute(SELECT_LOTS_SQL, (name,)).fetchall()
+    account = account_from_rows(name, row, holdings, lots)
+    if with_history:
+        account["transactions"] = [transaction_dict(*row) for row in conn.execute(SELECT_TRANSACTIONS_SQL, (name,))]
+        account["portfolio_value_time_series"] = conn.execute(SELECT_SNAPSHOTS_SQL, (name,)).fetchall()
+    return account
+
+
+def read_transactions(name: str, after_id: int = 0, limit: int = 100) -> list[tuple[int, dict]]:
+    ''' Page through an account's transactions oldest first; pass the last id seen as after_id '''
+    rows = get_connection().execute(SELECT_TRANSACTIONS_PAGE_SQL, (name.lower(), after_id, limit)).fetchall()
+    return [(row[0], transaction_dict(*row[1:])) for row in rows]
+
+
+def read_recent_transactions(name: str, limit: int = 10) -> list[dict]:
+    ''' The most recent transactions, newest first '''
+    rows = get_connection().execute(SELECT_RECENT_TRANSACTIONS_SQL, (name.lower(), limit)).fetchall()
+    return [transaction_dict(*row[1:]) for row in rows]
+
+
+def read_account_version(name: str) -> int:
+    ''' The account's version (-1 if it doesn't exist yet); every committed write to it bumps it '''
+    return get_connection().execute(SELECT_ACCOUNT_VERSION_SQL, (name.lower(),)).fetchone()[0]
+
+
+def sum_transactions(name: str) -> float:
+    ''' Sum of quantity * price over all of an account's transactions '''
+    return get_connection().execute(SUM_TRANSACTIONS_SQL, (name.lower(),)).fetchone()[0]
+
+
+def read_portfolio_snapshots(name: str, after_id: int = 0, limit: int = 1000) -> list[tuple[int, str, float]]:
+    ''' Page through the portfolio value time series as (id, datetime, value) rows '''
+    return get_connection().execute(SELECT_SNAPSHOTS_PAGE_SQL, (name.lower(), after_id, limit)).fetchall()
+
 
 def write_log(name: str, type: str, message: str):
     '''
@@ -54,16 +663,23 @@ def write_log(name: str, type: str, message: str):
         type (str): The type of log entry
         message (str): The log message
     '''
+    with transaction() as conn:
+        conn.execute(INSERT_LOG_SQL, (name.lower(), type, message))
+        conn.execute(INSERT_EVENT_SQL, (name.lower(), EVENT_LOG))
+
 
-    now = datetime.now().isoformat()
+def write_logs(rows: list[tuple[str, str, str, str]]):
+    '''
+    Write a batch of log entries in one transaction
+
+    Args:
+        rows: (name, datetime, type, message) tuples; datetime is UTC 'YYYY-MM-DD HH:MM:SS',
+              the same format as datetime('now') in write_log
+    '''
+    with transaction() as conn:
+        conn.executemany(INSERT_LOG_AT_SQL, [(name.lower(), at, type, message) for name, at, type, message in rows])
+        conn.executemany(INSERT_EVENT_SQL, [(name, EVENT_LOG) for name in {row[0].lower() for row in rows}])
 
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO logs (name, datetime, type, message)
-            VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
 
 def read_log(name: str, last_n=10):
     '''
@@ -72,38 +688,73 @@ def read_log(name: str, last_n=10):
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-    
+
     Return:
         list: A list of tuples containing (datetime, type, message)
     '''
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
+    rows = get_connection().execute(SELECT_LOG_SQL, (name.lower(), last_n)).fetchall()
+    return rows[::-1]
+
+
+def read_log_since(name: str, last_id: int = 0, last_n=10) -> list[tuple[int, str, str, str]]:
+    '''
+    Read log entries newer than last_id, for polling without re-reading what's already shown.
+
+    Args:
+        name (str): The name to retrieve logs for
+        last_id (int): The id of the last entry already seen (0 for none)
+        last_n (int): At most this many of the newest entries are returned
+
+    Return:
+        list: (id, datetime, type, message) tuples, oldest first; pass the last id back next time
+    '''
+    rows = get_connection().execute(SELECT_LOG_SINCE_SQL, (name.lower(), last_id, last_n)).fetchall()
+    return rows[::-1]
+
+
+def write_metrics(metrics: dict) -> None:
+    ''' Store one trader run's metrics (METRICS_FIELDS; tools and servers as dicts) '''
+    name = metrics['name'].lower()
+    row = {**metrics, 'name': name, 'tools': json.dumps(metrics['tools']), 'servers': json.dumps(metrics['servers'])}
+    with transaction() as conn:
+        conn.execute(INSERT_METRICS_SQL, [row[field] for field in METRICS_FIELDS])
+        conn.execute(INSERT_EVENT_SQL, (name, EVENT_METRICS))
+
+
+def read_metrics(name: str, last_n: int = 10) -> list[dict]:
+    ''' The trader's last_n runs, newest first, as dicts with id and METRICS_FIELDS '''
+    rows = get_connection().execute(SELECT_METRICS_SQL, (name.lower(), last_n)).fetchall()
+    runs = [dict(zip(['id', *METRICS_FIELDS], row)) for row in rows]
+    for run in runs:
+        run['tools'] = json.loads(run['tools'] or '{}')
+        run['servers'] = json.loads(run['servers'] or '{}')
+    return runs
+
+
+def read_metrics_summary(since: str = '') -> list[dict]:
+    ''' Averages per (trader, model) over the runs started since `since` (UTC 'YYYY-MM-DD HH:MM:SS') '''
+    rows = get_connection().execute(SELECT_METRICS_SUMMARY_SQL, (since,)).fetchall()
+    return [dict(zip(METRICS_SUMMARY_FIELDS, row)) for row in rows]
 
-        # return reversed(cursor.fetchall())
-        return (cursor.fetchall())[::-1]
-    
 
 def write_market(date: str, data: dict) -> None:
     data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO market (date, data)
-            VALUES (?, ?)
-            ON CONFLICT(date) DO UPDATE SET data=excluded.data
-        ''', (date, data_json))
-        conn.commit()
+    with transaction() as conn:
+        conn.execute(UPSERT_MARKET_SQL, (date, data_json))
 
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    row = get_connection().execute(SELECT_MARKET_SQL, (date,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def write_prices(cache: str, prices: dict[str, tuple[float, float]]) -> None:
+    ''' Upsert {symbol: (price, fetched at epoch seconds)} into the cache's rows '''
+    with transaction() as conn:
+        conn.executemany(UPSERT_PRICE_SQL, [(cache, symbol, price, at) for symbol, (price, at) in prices.items()])
+
+
+def read_prices(cache: str, since: float) -> dict[str, tuple[float, float]]:
+    ''' The cache's rows fetched at or after `since` (epoch seconds) '''
+    rows = get_connection().execute(SELECT_PRICES_SQL, (cache, since)).fetchall()
+    return {symbol: (price, at) for symbol, price, at in rows}
@@ -0,0 +1,163 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+import database
+from database import SELECT_EVENTS_SQL, SELECT_LAST_EVENT_ID_SQL
+
+
+## Cross-process change feed. Every write in database.py / async_database.py also inserts a row
+## into the events table in the same transaction, so an event exists iff its change committed.
+## A watcher in the reading process (the dashboard) polls PRAGMA data_version - a counter SQLite
+## bumps when another connection commits, answered from shared memory without reading the file -
+## and only when it moves reads the new event rows and hands them to subscribers.
+
+POLL_SECONDS = 0.25      # how often data_version is checked
+DEBOUNCE_SECONDS = 0.2   # a burst of events (a trade writes several) is delivered as one update
+KEEPALIVE_SECONDS = 15   # listen() yields None this often while idle, so a closed client is noticed
+
+
+class _LoopQueue:
+    ''' An asyncio.Queue the watcher thread can put() into, like a queue.Queue '''
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def put(self, kind: str) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, kind)
+        except RuntimeError:
+            pass  # the loop closed before the subscriber unsubscribed
+
+
+class EventWatcher:
+    '''
+    Watches the database for committed changes and fans them out per trader name.
+
+        watcher = EventWatcher()
+        for kinds in watcher.listen("ed"):   # blocks; kinds is e.g. {"account", "log"}
+            ...
+        async for kinds in watcher.alisten("ed"):   # the same, awaited on the event loop
+            ...
+    '''
+
+    def __init__(self, poll_seconds: float = POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._subscribers: dict[str, set[queue.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.last_id = 0
+        self.polls = 0
+        self.reads = 0  # polls that found a change and read the events table
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-watcher", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        # a dedicated connection: data_version only moves for commits made by *other* connections
+        conn = sqlite3.connect(database.DB, uri=database.DB.startswith('file:'), check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout = {database.BUSY_TIMEOUT_MS}')
+        self.last_id = conn.execute(SELECT_LAST_EVENT_ID_SQL).fetchone()[0]
+        version = None
+        while not self._stop.wait(self.poll_seconds):
+            self.polls += 1
+            try:
+                current = conn.execute('PRAGMA data_version').fetchone()[0]
+                if current == version:
+                    continue
+                version = current
+                self.reads += 1
+                events = conn.execute(SELECT_EVENTS_SQL, (self.last_id,)).fetchall()
+            except sqlite3.Error as e:
+                print(f"Event watcher failed to read events: {e}")
+                continue
+            for event_id, name, kind in events:
+                self.last_id = event_id
+                self._publish(name, kind)
+        conn.close()
+
+    def _publish(self, name: str, kind: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(name, ()))
+        for q in subscribers:
+            q.put(kind)
+
+    def subscribe(self, name: str, q: queue.Queue | _LoopQueue | None = None) -> queue.Queue | _LoopQueue:
+        self.start()
+        q = queue.Queue() if q is None else q
+        with self._lock:
+            self._subscribers[name.lower()].add(q)
+        return q
+
+    def unsubscribe(self, name: str, q: queue.Queue | _LoopQueue) -> None:
+        with self._lock:
+            self._subscribers[name.lower()].discard(q)
+
+    def listen(self, name: str, keepalive: float = KEEPALIVE_SECONDS):
+        '''
+        Generator of the set of event kinds for name each time something changes, coalescing
+        bursts; yields None after `keepalive` idle seconds. Unsubscribes when closed.
+        '''
+        q = self.subscribe(name)
+        try:
+            while True:
+                try:
+                    kinds = {q.get(timeout=keepalive)}
+                except queue.Empty:
+                    yield None
+                    continue
+                deadline = time.monotonic() + DEBOUNCE_SECONDS
+                while (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        kinds.add(q.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                yield kinds
+        finally:
+            self.unsubscribe(name, q)
+
+    async def alisten(self, name: str, keepalive: float = KEEPALIVE_SECONDS):
+        '''
+        listen() as an async generator: waiting for a change awaits on the event loop instead
+        of parking a thread, so idle subscribers cost nothing but a queue.
+        '''
+        q = self.subscribe(name, _LoopQueue())
+        try:
+            while True:
+                try:
+                    kinds = {await asyncio.wait_for(q.queue.get(), keepalive)}
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                deadline = time.monotonic() + DEBOUNCE_SECONDS
+                while (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        kinds.add(await asyncio.wait_for(q.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                yield kinds
+        finally:
+            self.unsubscribe(name, q)
+
+
+_watcher: EventWatcher | None = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher() -> EventWatcher:
+    ''' The process-wide watcher, started on first use '''
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = EventWatcher()
+        return _watcher
@@ -0,0 +1,207 @@
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import AsyncIterator, Callable
+from pydantic import BaseModel, TypeAdapter
+from agents import ModelResponse, Usage, generation_span
+from agents.items import TResponseOutputItem
+from agents.models.interface import Model
+from agents.models.multi_provider import MultiProvider
+from agents.usage import InputTokensDetails, OutputTokensDetails
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+
+## record/replay cache for model calls, so a trader cycle can be re-run from disk, offline and free
+##   off     : call the model every time (default)
+##   record  : call the model and store every response, replacing what was there
+##   replay  : answer only from the cache; a miss raises LLMCacheMiss instead of calling the model
+##   auto    : answer from the cache on an exact match, otherwise call the model and store the response
+# Each response is keyed on a hash of (model, instructions, messages, tools, settings). The prompts
+# carry the time and the account and the tools return live prices, so a re-run never matches a
+# recording exactly; when the exact key misses, replay falls back to the conversation's shape: the
+# same instructions and messages with every number masked and the same model turns so far,
+# whatever the tools returned. Replayed turns are then the recorded ones, so a re-run follows the
+# recording. auto never falls back: live prices and balances differ, and a call that only matches
+# by shape gets a fresh answer rather than a recorded one made on different numbers.
+
+LLM_CACHE_MODES = ("off", "record", "replay", "auto")
+llm_cache_mode = os.getenv("LLM_CACHE", "off").strip().lower() or "off"
+llm_cache_dir = os.getenv("LLM_CACHE_DIR") or "llm_cache"
+
+if llm_cache_mode not in LLM_CACHE_MODES:
+    raise ValueError(f"LLM_CACHE must be one of {', '.join(LLM_CACHE_MODES)}, not {llm_cache_mode!r}")
+
+NUMBER = re.compile(r"\d+(\.\d+)?")  # times, prices, balances, quantities
+
+_output_items = TypeAdapter(list[TResponseOutputItem])
+_write_lock = threading.Lock()
+
+
+class LLMCacheMiss(Exception):
+    ''' LLM_CACHE=replay and no recorded response matches the call '''
+
+
+def _plain(value):
+    # json.dumps default: pydantic models and dataclasses to dicts, anything else by repr
+    if isinstance(value, BaseModel):
+        return value.model_dump(exclude_none=True)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    return repr(value)
+
+
+def _tool_key(tool) -> dict:
+    return {
+        "name": getattr(tool, "name", type(tool).__name__),
+        "description": getattr(tool, "description", None),
+        "parameters": getattr(tool, "params_json_schema", None),
+    }
+
+
+def _conversation_shape(input):
+    # numbers in the messages masked, tool outputs blanked, the model's own turns kept
+    if isinstance(input, str):
+        return NUMBER.sub("#", input)
+    shape = []
+    for item in input:
+        item = item if isinstance(item, dict) else _plain(item)
+        if not isinstance(item, dict):
+            shape.append(item)
+        elif item.get("role") in ("user", "system", "developer"):
+            shape.append({**item, "content": NUMBER.sub("#", json.dumps(item.get("content"), default=_plain))})
+        elif str(item.get("type", "")).endswith("_output"):
+            shape.append({**item, "output": None})
+        else:
+            shape.append(item)
+    return shape
+
+
+def cache_keys(model_name, system_instructions, input, model_settings, tools, output_schema, handoffs) -> tuple[str, str]:
+    ''' (exact, shape) keys for a call '''
+    call = {
+        "model": model_name,
+        "system": system_instructions,
+        "input": input,
+        "settings": model_settings.to_json_dict(),
+        "tools": [_tool_key(tool) for tool in tools],
+        "output_schema": output_schema.json_schema() if output_schema and not output_schema.is_plain_text() else None,
+        "handoffs": [handoff.tool_name for handoff in handoffs],
+    }
+
+    def digest(value) -> str:
+        return hashlib.sha256(json.dumps(value, sort_keys=True, default=_plain).encode()).hexdigest()
+
+    shape = {
+        **call,
+        "system": NUMBER.sub("#", system_instructions or ""),
+        "input": _conversation_shape(input),
+    }
+    return digest(call), digest(shape)
+
+
+def cache_path(key: str) -> str:
+    return os.path.join(llm_cache_dir, key[:2], f"{key}.json")
+
+
+def read_response(key: str) -> ModelResponse | None:
+    path = cache_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    usage = data["usage"]
+    return ModelResponse(
+        output=_output_items.validate_python(data["output"]),
+        usage=Usage(
+            requests=usage["requests"],
+            input_tokens=usage["input_tokens"],
+            input_tokens_details=InputTokensDetails(**usage["input_tokens_details"]),
+            output_tokens=usage["output_tokens"],
+            output_tokens_details=OutputTokensDetails(**usage["output_tokens_details"]),
+            total_tokens=usage["total_tokens"],
+        ),
+        response_id=data["response_id"],
+    )
+
+
+def write_response(keys: tuple[str, ...], model_name: str, response: ModelResponse) -> None:
+    data = json.dumps({
+        "model": model_name,
+        "output": [item.model_dump(exclude_none=True) for item in response.output],
+        "usage": dataclasses.asdict(response.usage),
+        "response_id": response.response_id,
+    }, default=_plain)
+    # written to a temp file and renamed, so concurrent traders never read half a response
+    with _write_lock:
+        for key in keys:
+            path = cache_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+
+class CachedModel(Model):
+    '''
+    A Model that records and replays another one's responses. The real model is only built on a
+    miss, so a full replay needs neither network access nor API keys.
+    '''
+
+    def __init__(self, model_name: str, create_model: Callable[[], Model], mode: str = llm_cache_mode):
+        self.model_name = model_name
+        self.mode = mode
+        self._create_model = create_model
+        self._model: Model | None = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> Model:
+        if self._model is None:
+            self._model = self._create_model()
+        return self._model
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs) -> ModelResponse:
+        keys = cache_keys(self.model_name, system_instructions, input, model_settings, tools, output_schema, handoffs)
+        if self.mode in ("replay", "auto"):
+            response = read_response(keys[0])
+            if response is None and self.mode == "replay":
+                response = read_response(keys[1])
+            if response is not None:
+                self.hits += 1
+                # a span like the real model's, so the metrics still count the turn (as a cache hit)
+                with generation_span(
+                    model=self.model_name,
+                    model_config={"llm_cache": "hit"},
+                    usage={"input_tokens": response.usage.input_tokens, "output_tokens": response.usage.output_tokens},
+                    disabled=tracing.is_disabled(),
+                ):
+                    return response
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No recorded {self.model_name} response for this call (key {keys[0][:12]}) in {llm_cache_dir}")
+        self.misses += 1
+        response = await self.model.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing, **kwargs
+        )
+        write_response(keys, self.model_name, response)
+        return response
+
+    def stream_response(self, *args, **kwargs) -> AsyncIterator:
+        # the traders never stream (Runner.run), so streamed calls just go straight to the model
+        return self.model.stream_response(*args, **kwargs)
+
+
+def cached_model(model_name: str, model: Model | str) -> Model | str:
+    ''' Wrap what get_model() returns in the cache, unless LLM_CACHE is off '''
+    if llm_cache_mode == "off":
+        return model
+    if isinstance(model, str):
+        # a plain model name is resolved the way Runner would resolve it
+        return CachedModel(model_name, lambda: MultiProvider().get_model(model))
+    return CachedModel(model_name, lambda: model)
@@ -0,0 +1,197 @@
+"""
+Log retention for accounts.db: prune old trace/span logs per trader, rolling each pruned
+trader run up into one row of log_summaries, then hand the freed pages back to the OS.
+
+    uv run log_retention.py accounts.db --max-age-days 7 --max-rows 5000
+    uv run log_retention.py accounts.db --dry-run
+
+A trader keeps at most --max-rows log rows and nothing older than --max-age-days. The cut
+is moved back to the start of the run it falls in, so a run is summarized whole; only the
+dashboard's live tail lives in logs. The trading floor runs the same job after each cycle.
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL, which new databases get from database.py.
+An older file is converted once by this CLI with a full VACUUM (pass --no-vacuum to skip).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from database import CREATE_LOG_SUMMARIES_SQL, CREATE_LOG_SUMMARIES_INDEX_SQL, get_connection
+
+
+MAX_AGE_DAYS = float(os.getenv('LOG_RETENTION_DAYS', '7'))
+MAX_ROWS = int(os.getenv('LOG_RETENTION_ROWS', '5000'))  # per trader
+VACUUM_PAGES = 1000  # pages freed per incremental vacuum step when run periodically
+EVENTS_KEPT = 10_000  # the events feed only needs to cover a watcher's poll gap
+
+SELECT_LOG_NAMES_SQL = 'SELECT DISTINCT name FROM logs'
+SELECT_ROW_CUTOFF_SQL = 'SELECT id FROM logs WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?'
+SELECT_AGE_CUTOFF_SQL = 'SELECT MAX(id) FROM logs WHERE name = ? AND datetime < ?'
+SELECT_RUN_START_SQL = '''
+    SELECT MAX(id) FROM logs
+    WHERE name = ? AND id <= ? AND type = 'trace' AND message LIKE 'Started:%'
+'''
+SELECT_RUN_ENDED_SQL = '''
+    SELECT 1 FROM logs
+    WHERE name = ? AND id BETWEEN ? AND ? AND type = 'trace' AND message LIKE 'Ended:%'
+    LIMIT 1
+'''
+SELECT_PRUNED_LOGS_SQL = 'SELECT datetime, type, message FROM logs WHERE name = ? AND id <= ? ORDER BY id'
+INSERT_LOG_SUMMARY_SQL = '''
+    INSERT INTO log_summaries (name, run, started, ended, entries, types, tools)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+DELETE_PRUNED_LOGS_SQL = 'DELETE FROM logs WHERE name = ? AND id <= ?'
+DELETE_OLD_EVENTS_SQL = 'DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?'
+
+
+def find_cutoff(conn: sqlite3.Connection, name: str, max_age_days: float, max_rows: int) -> int:
+    ''' Highest log id to prune for name (0 for none), moved back so no run is split '''
+    cutoff = 0
+    row = conn.execute(SELECT_ROW_CUTOFF_SQL, (name, max_rows)).fetchone()
+    if row:
+        cutoff = row[0]
+    before = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    cutoff = max(cutoff, conn.execute(SELECT_AGE_CUTOFF_SQL, (name, before)).fetchone()[0] or 0)
+    if cutoff:
+        start = conn.execute(SELECT_RUN_START_SQL, (name, cutoff)).fetchone()[0]
+        if start and not conn.execute(SELECT_RUN_ENDED_SQL, (name, start, cutoff)).fetchone():
+            cutoff = start - 1
+    return cutoff
+
+
+def summarize(rows) -> list[tuple]:
+    '''
+    Group (datetime, type, message) log rows into runs, split at each 'Started: <trace>' line.
+    Returns (run, started, ended, entries, types json, tools json) tuples.
+    '''
+    summaries = []
+    run = None
+
+    def close():
+        if run and run['entries']:
+            summaries.append((
+                run['run'], run['started'], run['ended'], run['entries'],
+                json.dumps(run['types']), json.dumps(run['tools']),
+            ))
+
+    for timestamp, type, message in rows:
+        if run is None or (type == 'trace' and message.startswith('Started:')):
+            close()
+            trace_name = message.split(':', 1)[1].strip() if type == 'trace' and message.startswith('Started:') else None
+            run = {'run': trace_name, 'started': timestamp, 'ended': timestamp, 'entries': 0,
+                   'types': Counter(), 'tools': Counter()}
+        run['ended'] = timestamp
+        run['entries'] += 1
+        run['types'][type] += 1
+        # e.g. 'Started function buy_shares' - one per tool call
+        if type == 'function' and message.startswith('Started function '):
+            run['tools'][message.removeprefix('Started function ').split(' ')[0]] += 1
+    close()
+    return summaries
+
+
+def compact_logs(conn: sqlite3.Connection, max_age_days: float = MAX_AGE_DAYS, max_rows: int = MAX_ROWS,
+                 dry_run: bool = False) -> dict[str, tuple[int, int]]:
+    '''
+    Prune and roll up each trader's old logs, one trader per transaction.
+    Returns {name: (log rows pruned, summaries written)}.
+    '''
+    conn.execute(CREATE_LOG_SUMMARIES_SQL)
+    conn.execute(CREATE_LOG_SUMMARIES_INDEX_SQL)
+    result = {}
+    for (name,) in conn.execute(SELECT_LOG_NAMES_SQL).fetchall():
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cutoff = find_cutoff(conn, name, max_age_days, max_rows)
+            if not cutoff:
+                conn.rollback()
+                continue
+            rows = conn.execute(SELECT_PRUNED_LOGS_SQL, (name, cutoff)).fetchall()
+            summaries = summarize(rows)
+            if dry_run:
+                conn.rollback()
+            else:
+                conn.executemany(INSERT_LOG_SUMMARY_SQL, [(name, *summary) for summary in summaries])
+                conn.execute(DELETE_PRUNED_LOGS_SQL, (name, cutoff))
+                conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        result[name] = (len(rows), len(summaries))
+    return result
+
+
+def prune_events(conn: sqlite3.Connection, keep: int = EVENTS_KEPT) -> int:
+    ''' Drop all but the newest `keep` rows of the events feed (see events.py) '''
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'events'").fetchone():
+        return 0
+    return conn.execute(DELETE_OLD_EVENTS_SQL, (keep,)).rowcount
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int | None = None) -> int:
+    ''' Return up to `pages` free pages (all if None) to the OS; returns the number freed '''
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:  # 2 = INCREMENTAL
+        return 0
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    conn.execute(f'PRAGMA incremental_vacuum({pages or 0})').fetchall()
+    return free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    ''' Switch an existing database to auto_vacuum=INCREMENTAL; needs a one-off full VACUUM '''
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return False
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+    return True
+
+
+def run_retention() -> dict[str, tuple[int, int]]:
+    ''' The periodic job: compact the current DB through the pooled connection, then free a few pages '''
+    conn = get_connection()
+    result = compact_logs(conn)
+    prune_events(conn)
+    if result:
+        incremental_vacuum(conn, VACUUM_PAGES)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='accounts.db files to compact')
+    parser.add_argument('--max-age-days', type=float, default=MAX_AGE_DAYS)
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS, help='log rows kept per trader')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be pruned, change nothing')
+    parser.add_argument('--no-vacuum', action='store_true', help="don't shrink the file afterwards")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        try:
+            with sqlite3.connect(path, isolation_level=None) as conn:
+                before = os.path.getsize(path)
+                result = compact_logs(conn, args.max_age_days, args.max_rows, args.dry_run)
+                for name, (pruned, summaries) in sorted(result.items()):
+                    print(f'{path}: {name}: {"would prune" if args.dry_run else "pruned"} {pruned} log rows into {summaries} run summaries')
+                if not result:
+                    print(f'{path}: nothing to prune')
+                if not args.dry_run:
+                    print(f'{path}: dropped {prune_events(conn):,} old events')
+                if not args.dry_run and not args.no_vacuum:
+                    if enable_incremental_vacuum(conn):
+                        print(f'{path}: converted to auto_vacuum=INCREMENTAL')
+                    else:
+                        incremental_vacuum(conn)
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+                    print(f'{path}: {before:,} -> {os.path.getsize(path):,} bytes')
+        except sqlite3.Error as e:
+            print(f'{path}: failed - {e}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from database import write_logs
+
+
+QUEUE_SIZE = 10_000           # entries waiting to be written before callers feel backpressure
+BATCH_SIZE = 200              # flush as soon as this many entries are waiting
+FLUSH_INTERVAL_SECONDS = 0.5  # ...or once the oldest waiting entry is this old
+FULL_WAIT_SECONDS = 0.05      # how long a caller waits on a full queue before the entry is dropped
+
+_STOP = object()
+
+
+class LogWriter:
+    '''
+    Background writer for the logs table.
+
+    write() only timestamps the entry and puts it on a bounded queue; a daemon thread takes
+    entries off in batches and inserts each batch in a single transaction. If the database
+    falls behind and the queue fills, callers wait up to FULL_WAIT_SECONDS and then the entry
+    is dropped, so a slow disk can delay tracing a little but never stall a trader.
+    '''
+
+    def __init__(
+        self,
+        queue_size: int = QUEUE_SIZE,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.full_waits = 0   # writes that found the queue full (backpressure)
+        self.dropped = 0      # ...and gave up after waiting
+        self.errors = 0
+        self.max_depth = 0
+        self.write_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def write(self, name: str, type: str, message: str) -> None:
+        if self._closed:
+            return
+        self.start()
+        at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        entry = (name, at, type, message)
+        waited = False
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            waited = True
+            try:
+                self._queue.put(entry, timeout=FULL_WAIT_SECONDS)
+            except queue.Full:
+                with self._lock:
+                    self.full_waits += 1
+                    self.dropped += 1
+                return
+        with self._lock:
+            self.full_waits += waited
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _write_batch(self, batch: list) -> None:
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            write_logs(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"Log writer failed to write {len(batch)} entries: {e}")
+        self.write_seconds += time.perf_counter() - start
+        batch.clear()
+
+    def _run(self) -> None:
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_batch(batch)
+                deadline = None
+                continue
+            if item is _STOP or isinstance(item, threading.Event):
+                self._write_batch(batch)
+                deadline = None
+                if item is _STOP:
+                    return
+                item.set()
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                deadline = None
+
+    def flush(self, timeout: float | None = 10) -> bool:
+        ''' Block until everything written so far is in the database '''
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 10) -> None:
+        ''' Flush what's queued and stop the thread; later writes are ignored '''
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "queued": self._queue.qsize(),
+            "max_depth": self.max_depth,
+            "full_waits": self.full_waits,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "avg_batch": self.written / self.batches if self.batches else 0.0,
+            "write_seconds": self.write_seconds,
+        }
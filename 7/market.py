@@ -3,10 +3,14 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime
 import random
-from database import write_market, read_market
+import threading
+import market_calendar
+from database import read_market
+from price_cache import PriceCache
+from market_snapshot import MarketSnapshot, read_snapshot, write_snapshot
 from functools import lru_cache
 from datetime import timezone
-from typing import cast
+from typing import cast, Iterable
 from polygon.rest.models import PreviousCloseAgg, GroupedDailyAgg, TickerSnapshot
 import sys
 
@@ -15,16 +19,35 @@ load_dotenv(override=True)
 
 polygon_api_key = os.getenv("POLYGON_API_KEY")
 polygon_plan = os.getenv("POLYGON_PLAN")
+polygon_base_url = os.getenv("POLYGON_BASE_URL")  # e.g. http://127.0.0.1:8765 to run against polygon_stub.py
 
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+# how long a looked-up price stays fresh: EOD prices only move once a day, the paid plan's
+# snapshot is 15-min delayed but its minute bar advances every minute, realtime moves constantly
+PRICE_TTL_SECONDS = {"eod": 3600.0, "paid": 60.0, "realtime": 5.0}
+price_plan = "realtime" if is_realtime_polygon else "paid" if is_paid_polygon else "eod"
+price_ttl = float(os.getenv("PRICE_CACHE_TTL_SECONDS") or PRICE_TTL_SECONDS[price_plan])
+persist_prices = os.getenv("PRICE_CACHE_PERSIST", "true").strip().lower() == "true"
+
+# shared by every caller in the process; persisted as the 'prices:<plan>' rows of the prices table
+price_cache = PriceCache(price_ttl, persist_key=f"prices:{price_plan}" if persist_prices else None)
+
+SNAPSHOT_BATCH_SIZE = 250  # tickers per multi-ticker snapshot request
+
+
+@lru_cache(maxsize=1)
+def get_client() -> RESTClient:
+    ''' One shared client, so every lookup reuses the same urllib3 connection pool '''
+    if polygon_base_url:
+        return RESTClient(polygon_api_key, base=polygon_base_url)
+    return RESTClient(polygon_api_key)
+
 
 def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
-    market_status = client.get_market_status()
-    # return market_status?.market == 'open' as .js
-    return getattr(market_status, "market", None) == "open"
+    # answered from the local exchange calendar, not Polygon's market status endpoint
+    return market_calendar.is_market_open()
 
 
 # def get_all_share_prices_polygon_eod() -> dict[str, float]:
@@ -44,7 +67,7 @@ def is_market_open() -> bool:
 def get_all_share_prices_polygon_eod() -> dict[str, float]:
     # for multi request need to apply async 
     # from polygon import AsyncRESTClient
-    client = RESTClient(polygon_api_key)
+    client = get_client()
     agg_response = client.get_previous_close_agg("SPY")  # type: ignore
     probe = cast(PreviousCloseAgg, agg_response[0] if isinstance(agg_response, list) else agg_response)
     last_close = datetime.fromtimestamp(cast(float, probe.timestamp) / 1000, tz=timezone.utc).date()
@@ -59,42 +82,69 @@ def get_all_share_prices_polygon_eod() -> dict[str, float]:
     return out
 
 
+_market_lock = threading.Lock()
+
+
 @lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+def _get_market_for_prior_date(today) -> MarketSnapshot:
+    # the day's prices live in a mmapped columnar file; looking up a symbol never parses the whole day
+    snapshot = read_snapshot(today)
+    if snapshot is None:
+        market_data = read_market(today)  # days stored as JSON rows before the snapshot files
+        if not market_data:
+            market_data = get_all_share_prices_polygon_eod()
+        snapshot = write_snapshot(today, market_data)
+    return snapshot
+
 
+def get_market_for_prior_date(today) -> MarketSnapshot:
+    # lru_cache alone lets concurrent first callers all fetch the grouped daily; the lock makes it one fetch
+    with _market_lock:
+        return _get_market_for_prior_date(today)
 
-def get_share_price_polygon_eod(symbol) -> float:
+
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
     today = datetime.now().date().strftime("%Y-%m-%d")
     market_data = get_market_for_prior_date(today)
-    return market_data.get(symbol, 0.0) #找不到的時候回傳 0
+    return {symbol: market_data.get(symbol, 0.0) for symbol in symbols}
 
 
-def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
-    #'stocks'   # 美股
-    # 'options' # 選擇權
-    # 'forex'   # 外匯
-    # 'crypto'  # 加密貨幣
-    result = cast(TickerSnapshot, client.get_snapshot_ticker('stocks', symbol))
+def _snapshot_price(result: TickerSnapshot) -> float:
     min_close = cast(float, result.min.close) if result.min and result.min.close is not None else None
     prev_close = cast(float, result.prev_day.close) if result.prev_day and result.prev_day.close is not None else 0.0
     return min_close if min_close is not None else prev_close
 
-    # 使用 cast 等於 Typescript的 as 實際產品應該避免使用
-    # 應使用 if isinstance(result, TickerSnapshot):
-    #          result.min.close  # Pylance 確定是 TickerSnapshot
 
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    # one multi-ticker snapshot request per batch instead of one get_snapshot_ticker per symbol
+    client = get_client()
+    #'stocks'   # 美股
+    # 'options' # 選擇權
+    # 'forex'   # 外匯
+    # 'crypto'  # 加密貨幣
+    prices: dict[str, float] = {}
+    for i in range(0, len(symbols), SNAPSHOT_BATCH_SIZE):
+        results = client.get_snapshot_all('stocks', tickers=symbols[i:i + SNAPSHOT_BATCH_SIZE])
+        for result in results:
+            result = cast(TickerSnapshot, result)
+            if result.ticker is not None:
+                prices[result.ticker] = _snapshot_price(result)
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
 
-def get_share_price_polygon(symbol) -> float:
+
+def _fetch_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
     if is_paid_polygon:
-        return get_share_price_polygon_min(symbol)
+        return get_share_prices_polygon_min(symbols)
     else:
-        return get_share_price_polygon_eod(symbol)
+        return get_share_prices_polygon_eod(symbols)
+
+
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    return price_cache.get_many(symbols, _fetch_share_prices_polygon)
+
+
+def get_share_price_polygon(symbol) -> float:
+    return get_share_prices_polygon([symbol])[symbol]
 
 
 def get_share_price(symbol) -> float:
@@ -103,4 +153,17 @@ def get_share_price(symbol) -> float:
             return get_share_price_polygon(symbol)
         except Exception as e:
             print(f"Was not able to use the polygon API due to {e}; using a random number", file=sys.stderr)
-    return float(random.randint(1, 100))
\ No newline at end of file
+    return float(random.randint(1, 100))
+
+
+def get_share_prices(symbols: Iterable[str]) -> dict[str, float]:
+    ''' Batched get_share_price: one lookup for all symbols, returned as {symbol: price} '''
+    symbols = list(dict.fromkeys(symbols))  # dedupe, keep order
+    if not symbols:
+        return {}
+    if polygon_api_key:
+        try:
+            return get_share_prices_polygon(symbols)
+        except Exception as e:
+            print(f"Was not able to use the polygon API due to {e}; using random numbers", file=sys.stderr)
+    return {symbol: float(random.randint(1, 100)) for symbol in symbols}
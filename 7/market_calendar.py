@@ -0,0 +1,132 @@
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+
+## NYSE / Nasdaq trading calendar computed locally from the exchange rules, so "is the market
+## open" and "when does it next open" are answered from memory instead of asking Polygon.
+## Each year's holidays and early closes are worked out once and cached.
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+OPEN = time(9, 30)
+CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+# one-off closures no rule predicts (national days of mourning); add new ones here
+SPECIAL_CLOSURES = {
+    date(2018, 12, 5),   # George H. W. Bush
+    date(2025, 1, 9),    # Jimmy Carter
+}
+
+
+def easter(year: int) -> date:
+    ''' Gregorian Easter Sunday (anonymous Gregorian algorithm) '''
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    ''' The n-th (1-based) weekday (Monday=0) of the month; n=-1 for the last one '''
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(day: date) -> date:
+    ''' A fixed-date holiday on a Saturday is taken the Friday before, on a Sunday the Monday after '''
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def holidays(year: int) -> frozenset[date]:
+    days = {
+        nth_weekday(year, 1, 0, 3),             # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),             # Washington's Birthday
+        easter(year) - timedelta(days=2),       # Good Friday
+        nth_weekday(year, 5, 0, -1),            # Memorial Day
+        observed(date(year, 7, 4)),             # Independence Day
+        nth_weekday(year, 9, 0, 1),             # Labor Day
+        nth_weekday(year, 11, 3, 4),            # Thanksgiving
+        observed(date(year, 12, 25)),           # Christmas
+    }
+    # New Year's Day on a Saturday is not moved back into the old year
+    if date(year, 1, 1).weekday() != 5:
+        days.add(observed(date(year, 1, 1)))
+    if year >= 2022:
+        days.add(observed(date(year, 6, 19)))   # Juneteenth
+    return frozenset(days | {day for day in SPECIAL_CLOSURES if day.year == year})
+
+
+@lru_cache(maxsize=16)
+def early_closes(year: int) -> frozenset[date]:
+    ''' 1pm closes: July 3 and Christmas Eve when they fall Monday-Thursday, and the day after Thanksgiving '''
+    days = {nth_weekday(year, 11, 3, 4) + timedelta(days=1)}
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 4:
+            days.add(day)
+    return frozenset(days - holidays(year))
+
+
+def session(day: date) -> tuple[datetime, datetime] | None:
+    ''' (open, close) of the regular session on day, in exchange time, or None if it doesn't trade '''
+    if day.weekday() >= 5 or day in holidays(day.year):
+        return None
+    close = EARLY_CLOSE if day in early_closes(day.year) else CLOSE
+    return datetime.combine(day, OPEN, EXCHANGE_TZ), datetime.combine(day, close, EXCHANGE_TZ)
+
+
+def _now(at: datetime | None) -> datetime:
+    return (at or datetime.now(EXCHANGE_TZ)).astimezone(EXCHANGE_TZ)
+
+
+def is_market_open(at: datetime | None = None) -> bool:
+    at = _now(at)
+    hours = session(at.date())
+    return hours is not None and hours[0] <= at < hours[1]
+
+
+def next_open(after: datetime | None = None) -> datetime:
+    ''' Start of the first session opening after `after` (now by default) '''
+    after = _now(after)
+    day = after.date()
+    while True:
+        hours = session(day)
+        if hours and hours[0] > after:
+            return hours[0]
+        day += timedelta(days=1)
+
+
+def next_close(after: datetime | None = None) -> datetime:
+    ''' End of the session in progress at `after`, or else of the next one '''
+    after = _now(after)
+    day = after.date()
+    while True:
+        hours = session(day)
+        if hours and hours[1] > after:
+            return hours[1]
+        day += timedelta(days=1)
+
+
+def seconds_until_open(after: datetime | None = None) -> float:
+    ''' 0 while the market is open, otherwise how long until it next opens '''
+    after = _now(after)
+    if is_market_open(after):
+        return 0.0
+    # timestamps, not aware-datetime subtraction: both are in EXCHANGE_TZ, so Python would take
+    # the wall-clock difference and be an hour off across a DST change
+    return next_open(after).timestamp() - after.timestamp()
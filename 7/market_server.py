@@ -1,3 +1,4 @@
+import asyncio
 from mcp.server.fastmcp import FastMCP
 from market import get_share_price
 
@@ -10,7 +11,8 @@ async def lookup_share_price(symbol: str) -> float:
     Args:
         symbol: the symbol of the stock
     """
-    return get_share_price(symbol)
+    # off the event loop: when mounted in-process this loop is the trading floor's
+    return await asyncio.to_thread(get_share_price, symbol)
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
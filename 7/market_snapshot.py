@@ -0,0 +1,103 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+
+
+## compact columnar file for the grouped-daily snapshot (~10k tickers):
+##   header   : magic 'MKTSNAP1', uint32 count, uint32 symbol width
+##   symbols  : count fixed-width, NUL-padded symbols, sorted by their bytes
+##   prices   : count little-endian float64, 8-byte aligned, same order as symbols
+## A lookup mmaps the file and binary-searches the symbol column, so nothing is parsed up front.
+
+SNAPSHOT_DIR = 'market_data'
+MAGIC = b'MKTSNAP1'
+HEADER = struct.Struct('<8sII')
+
+
+def snapshot_path(date: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f'{date}.snap')
+
+
+def encode_snapshot(data: dict[str, float]) -> bytes:
+    ''' Serialize {symbol: price} into the columnar format '''
+    items = sorted((symbol.encode(), float(price)) for symbol, price in data.items())
+    width = max((len(symbol) for symbol, _ in items), default=1)
+    symbols = b''.join(symbol.ljust(width, b'\0') for symbol, _ in items)
+    padding = b'\0' * (-(HEADER.size + len(symbols)) % 8)
+    prices = struct.pack(f'<{len(items)}d', *(price for _, price in items))
+    return HEADER.pack(MAGIC, len(items), width) + symbols + padding + prices
+
+
+class MarketSnapshot:
+    ''' Read-only {symbol: price} view over an encoded snapshot (a mmapped file or bytes) '''
+
+    def __init__(self, buffer):
+        magic, self.count, self.width = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('not a market snapshot')
+        self._buffer = buffer
+        self._symbols_offset = HEADER.size
+        symbols_end = HEADER.size + self.count * self.width
+        self._prices_offset = symbols_end + (-symbols_end % 8)
+
+    @classmethod
+    def open(cls, path: str) -> 'MarketSnapshot':
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _symbol_at(self, i: int) -> bytes:
+        start = self._symbols_offset + i * self.width
+        return self._buffer[start:start + self.width]
+
+    def _index(self, symbol: str) -> int:
+        key = symbol.encode()
+        if len(key) > self.width:
+            return -1
+        key = key.ljust(self.width, b'\0')
+        i = bisect_left(range(self.count), key, key=self._symbol_at)
+        return i if i < self.count and self._symbol_at(i) == key else -1
+
+    def _price_at(self, i: int) -> float:
+        return struct.unpack_from('<d', self._buffer, self._prices_offset + 8 * i)[0]
+
+    def get(self, symbol: str, default=None):
+        i = self._index(symbol)
+        return self._price_at(i) if i >= 0 else default
+
+    def __getitem__(self, symbol: str) -> float:
+        i = self._index(symbol)
+        if i < 0:
+            raise KeyError(symbol)
+        return self._price_at(i)
+
+    def __contains__(self, symbol: str) -> bool:
+        return self._index(symbol) >= 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def items(self):
+        for i in range(self.count):
+            yield self._symbol_at(i).rstrip(b'\0').decode(), self._price_at(i)
+
+    def to_dict(self) -> dict[str, float]:
+        return dict(self.items())
+
+
+def write_snapshot(date: str, data: dict[str, float]) -> MarketSnapshot:
+    ''' Write the day's snapshot file atomically and return it opened '''
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(date)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(encode_snapshot(data))
+    os.replace(tmp, path)
+    return MarketSnapshot.open(path)
+
+
+def read_snapshot(date: str) -> MarketSnapshot | None:
+    path = snapshot_path(date)
+    if not os.path.exists(path):
+        return None
+    return MarketSnapshot.open(path)
@@ -0,0 +1,107 @@
+import asyncio
+import importlib
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from typing import Any
+import anyio
+from agents.mcp import MCPServer, MCPServerStdio, MCPServerStdioParams
+from mcp import ClientSession
+from mcp.shared.memory import create_client_server_memory_streams
+
+
+CLIENT_SESSION_TIMEOUT_SECONDS = 120
+
+
+class MCPServerInProcess(MCPServer):
+    '''
+    Mount one of our FastMCP servers (accounts_server, market_server, push_server) inside this
+    process. Client and server talk over anyio memory streams, so a tool call costs two queue
+    hand-offs instead of JSON over a pipe to a child process; the protocol is otherwise identical.
+
+    Built on the public MCPServer interface only (like LeasedServer in mcp_pool), so an SDK
+    upgrade can't break it by reshaping its private client-session base class.
+    '''
+
+    def __init__(self, module: str, cache_tools_list: bool = False, client_session_timeout_seconds: float | None = 5):
+        super().__init__()
+        self.module = module
+        self.cache_tools_list = cache_tools_list
+        self.client_session_timeout_seconds = client_session_timeout_seconds
+        self.session: ClientSession | None = None
+        self._tools = None
+        self._exit_stack = AsyncExitStack()
+        self._cleanup_lock = asyncio.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"inprocess: {self.module}"
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.cleanup()
+
+    async def connect(self):
+        server = importlib.import_module(self.module).mcp._mcp_server
+        try:
+            client_streams, server_streams = await self._exit_stack.enter_async_context(
+                create_client_server_memory_streams()
+            )
+            tg = await self._exit_stack.enter_async_context(anyio.create_task_group())
+            # runs before the streams close, so the server task is gone by then
+            self._exit_stack.callback(tg.cancel_scope.cancel)
+            tg.start_soon(lambda: server.run(*server_streams, server.create_initialization_options()))
+            timeout = self.client_session_timeout_seconds
+            session = await self._exit_stack.enter_async_context(
+                ClientSession(*client_streams, timedelta(seconds=timeout) if timeout else None)
+            )
+            await session.initialize()
+            self.session = session
+        except Exception:
+            await self.cleanup()
+            raise
+
+    async def cleanup(self):
+        async with self._cleanup_lock:
+            try:
+                await self._exit_stack.aclose()
+            finally:
+                self._exit_stack = AsyncExitStack()
+                self.session = None
+                self._tools = None
+
+    def _session(self) -> ClientSession:
+        if self.session is None:
+            raise RuntimeError(f"{self.name} is not connected; call connect() first")
+        return self.session
+
+    async def list_tools(self, run_context=None, agent=None):
+        if self._tools is None or not self.cache_tools_list:
+            self._tools = (await self._session().list_tools()).tools
+        return self._tools
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any] | None):
+        return await self._session().call_tool(tool_name, arguments)
+
+    async def list_prompts(self):
+        return await self._session().list_prompts()
+
+    async def get_prompt(self, name: str, arguments: dict[str, Any] | None = None):
+        return await self._session().get_prompt(name, arguments)
+
+
+def create_mcp_server(params: dict, cache_tools_list: bool = False) -> MCPServer:
+    ''' Build an MCP server from an entry of mcp_params: {"module": ...} mounts in-process, anything else is stdio '''
+    if "module" in params:
+        return MCPServerInProcess(
+            params["module"],
+            cache_tools_list=cache_tools_list,
+            client_session_timeout_seconds=CLIENT_SESSION_TIMEOUT_SECONDS,
+        )
+    return MCPServerStdio(
+        MCPServerStdioParams(**params),
+        client_session_timeout_seconds=CLIENT_SESSION_TIMEOUT_SECONDS,
+        cache_tools_list=cache_tools_list,
+    )
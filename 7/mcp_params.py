@@ -10,6 +10,17 @@ NPX = 'npx.cmd' if sys.platform == 'win32' else 'npx'
 serper_api_key = os.getenv('SERPER_API_KEY') or ''
 polygon_api_key = os.getenv("POLYGON_API_KEY") or ''
 is_pushover_activate = os.getenv("PUSH_OVER_ON", "false").strip().lower() == "true"
+# stdio (default): each of our own servers is a `uv run xxx_server.py` subprocess
+# inprocess: mount them inside the trading floor over memory streams (see mcp_inprocess.py)
+mcp_transport = os.getenv("MCP_TRANSPORT", "stdio").strip().lower()
+
+
+def local_server(module: str) -> dict:
+    ''' Params for one of our pure-Python FastMCP servers in this folder '''
+    if mcp_transport == "inprocess":
+        return {"module": module}
+    return {"command": "uv", "args": ["run", f"{module}.py"]}
+
 
 if is_paid_polygon or is_realtime_polygon:
     market_mcp = {
@@ -18,15 +29,18 @@ if is_paid_polygon or is_realtime_polygon:
         "env": {"POLYGON_API_KEY": polygon_api_key},
     }
 else:
-    market_mcp = {"command": "uv", "args": ["run", "market_server.py"]}
+    market_mcp = local_server("market_server")
 
 
 trader_mcp_server_params = [
-    {'command': 'uv', 'args': ['run', 'accounts_server.py']},
-    *([ {"command": "uv", "args": ["run", "push_server.py"]} ] if is_pushover_activate else []),
+    local_server("accounts_server"),
+    *([ local_server("push_server") ] if is_pushover_activate else []),
     market_mcp,
 ]
 
+# where each researcher's memory server keeps its knowledge graph; backtest.py points it at a temp dir
+MEMORY_DIR = "./memory"
+
 def researcher_mcp_server_params(name: str):
     return [
         {"command": "uvx", "args": ["mcp-server-fetch"]},
@@ -38,6 +52,6 @@ def researcher_mcp_server_params(name: str):
         {
             "command": NPX,
             "args": ["-y", "mcp-memory-libsql"],
-            "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
+            "env": {"LIBSQL_URL": f"file:{MEMORY_DIR}/{name}.db"},
         },
     ]
\ No newline at end of file
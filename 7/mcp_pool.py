@@ -0,0 +1,230 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Callable
+import anyio
+from agents.mcp import MCPServer
+from mcp.shared.exceptions import McpError
+from mcp_inprocess import create_mcp_server as create_any_mcp_server
+
+
+START_TIMEOUT_SECONDS = 120   # give up on a lease if its server can't be started in time
+HEALTH_CHECK_SECONDS = 30     # how often every running server is pinged
+PING_TIMEOUT_SECONDS = 10
+RESTART_BACKOFF_SECONDS = 2   # doubles on each consecutive failed start, capped at 60s
+# what a dead transport or process raises; anything else leaves the shared server running
+TRANSPORT_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, EOFError, OSError)
+
+
+def create_mcp_server(params: dict) -> MCPServer:
+    # the tool list of a pooled server never changes while it runs, so cache it across cycles
+    return create_any_mcp_server(params, cache_tools_list=True)
+
+
+def server_key(params: dict) -> str:
+    ''' Identical params share one server; e.g. each trader's memory server differs by its LIBSQL_URL '''
+    return json.dumps(params, sort_keys=True)
+
+
+class PooledServer:
+    '''
+    One long-lived MCP server plus the task that owns it.
+
+    MCP transports are anyio task groups, which must be entered and exited by the same task,
+    so connect, cleanup and every restart happen inside _run rather than in whichever trader
+    happened to use the server first.
+    '''
+
+    def __init__(self, key: str, factory: Callable[[], MCPServer]):
+        self.key = key
+        self.factory = factory
+        self.server: MCPServer | None = None
+        self.leases = 0
+        self.restarts = 0
+        self.last_error: str | None = None
+        self._ready = asyncio.Event()
+        self._restart = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name=f"mcp-pool {key[:60]}")
+
+    async def _run(self) -> None:
+        backoff = RESTART_BACKOFF_SECONDS
+        while not self._stop.is_set():
+            server = self.factory()
+            try:
+                await server.connect()
+            except Exception as e:
+                self.last_error = f"start failed: {e}"
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            backoff = RESTART_BACKOFF_SECONDS
+            self.server = server
+            self._ready.set()
+
+            stop = asyncio.create_task(self._stop.wait())
+            restart = asyncio.create_task(self._restart.wait())
+            await asyncio.wait([stop, restart], return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            restart.cancel()
+
+            self._ready.clear()
+            self.server = None
+            try:
+                await server.cleanup()
+            except Exception as e:
+                self.last_error = f"cleanup failed: {e!r}"
+            if self._restart.is_set() and not self._stop.is_set():
+                self._restart.clear()
+                self.restarts += 1
+
+    async def get(self, timeout: float = START_TIMEOUT_SECONDS) -> MCPServer:
+        ''' The running server, waiting for a (re)start in progress '''
+        try:
+            async with asyncio.timeout(timeout):
+                while self.server is None or not self._ready.is_set():
+                    await self._ready.wait()
+        except TimeoutError:
+            raise RuntimeError(f"MCP server {self.key} is not running: {self.last_error}") from None
+        return self.server
+
+    def restart(self, reason: str) -> None:
+        if self._ready.is_set():
+            # stop handing out the broken server straight away, not once _run gets round to it
+            self._ready.clear()
+            self.last_error = reason
+            self._restart.set()
+
+    async def check(self) -> bool:
+        ''' Ping the server; schedule a restart if it doesn't answer '''
+        server = self.server
+        session = getattr(server, "session", None)
+        if not self._ready.is_set() or session is None:
+            return False
+        try:
+            await asyncio.wait_for(session.send_ping(), PING_TIMEOUT_SECONDS)
+            return True
+        except Exception as e:
+            self.restart(f"health check failed: {e!r}")
+            return False
+
+    async def stop(self) -> None:
+        self._stop.set()
+        await self._task
+
+
+class LeasedServer(MCPServer):
+    '''
+    Stable MCPServer handle given to an Agent for a lease.
+
+    It forwards to whatever server the pool is currently running under the key, so a
+    restart between calls is invisible to the agent; connect and cleanup are the pool's job.
+    '''
+
+    def __init__(self, pooled: PooledServer, name: str):
+        super().__init__()
+        self._pooled = pooled
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    async def connect(self):
+        await self._pooled.get()
+
+    async def cleanup(self):
+        pass
+
+    async def _call(self, method: str, *args, **kwargs) -> Any:
+        server = await self._pooled.get()
+        try:
+            return await getattr(server, method)(*args, **kwargs)
+        except McpError:
+            # a timeout or error answer for this request; the server is shared, so keep it up
+            raise
+        except TRANSPORT_ERRORS as e:
+            self._pooled.restart(f"{method} failed: {e!r}")
+            raise
+
+    async def list_tools(self, run_context=None, agent=None):
+        return await self._call("list_tools", run_context, agent)
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any] | None):
+        return await self._call("call_tool", tool_name, arguments)
+
+    async def list_prompts(self):
+        return await self._call("list_prompts")
+
+    async def get_prompt(self, name: str, arguments: dict[str, Any] | None = None):
+        return await self._call("get_prompt", name, arguments)
+
+
+class MCPServerPool:
+    '''
+    Long-lived MCP servers shared by every trader on the floor.
+
+    Servers start on their first lease and then stay warm across cycles; a background task
+    pings each one and restarts any that crashed or stopped answering. Servers with identical
+    params are shared, so the accounts/market/fetch/search servers run once for the whole
+    floor while each trader's memory server (different LIBSQL_URL) is its own.
+
+        async with MCPServerPool() as pool:
+            async with pool.lease(trader_mcp_server_params) as servers:
+                ...
+    '''
+
+    def __init__(self, factory: Callable[[dict], MCPServer] = create_mcp_server):
+        self.factory = factory
+        self._servers: dict[str, PooledServer] = {}
+        self._health_task: asyncio.Task | None = None
+
+    async def __aenter__(self):
+        self._health_task = asyncio.create_task(self._health_loop(), name="mcp-pool health")
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_SECONDS)
+            await asyncio.gather(*[pooled.check() for pooled in list(self._servers.values())])
+
+    def _get(self, params: dict) -> PooledServer:
+        key = server_key(params)
+        if key not in self._servers:
+            self._servers[key] = PooledServer(key, lambda: self.factory(params))
+        return self._servers[key]
+
+    @asynccontextmanager
+    async def lease(self, params_list: list[dict]):
+        ''' Borrow warm servers for params_list, starting any that aren't running yet '''
+        pooled = [self._get(params) for params in params_list]
+        servers = [await p.get() for p in pooled]
+        leased = [LeasedServer(p, server.name) for p, server in zip(pooled, servers)]
+        for p in pooled:
+            p.leases += 1
+        try:
+            yield leased
+        finally:
+            for p in pooled:
+                p.leases -= 1
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "server": json.loads(key).get("module") or json.loads(key).get("args", []),
+                "running": pooled.server is not None,
+                "leases": pooled.leases,
+                "restarts": pooled.restarts,
+                "last_error": pooled.last_error,
+            }
+            for key, pooled in self._servers.items()
+        ]
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+        await asyncio.gather(*[pooled.stop() for pooled in self._servers.values()], return_exceptions=True)
+        self._servers.clear()
@@ -0,0 +1,51 @@
+"""
+Convert accounts.db files from the old single-JSON-blob accounts table to the normalized
+accounts / holdings / transactions / portfolio_snapshots tables.
+
+    uv run migrate_accounts.py accounts.db ../6/accounts.db
+
+database.py already runs the same migration on first use of its own DB; this tool is for
+converting other copies offline. The old rows are kept in accounts_legacy.
+Note the 6/ labs still read the JSON layout, so only convert 6/accounts.db for use with 7/.
+"""
+import argparse
+import sqlite3
+import sys
+
+from database import SCHEMA_SQL, is_legacy_schema, migrate_legacy_accounts
+
+
+def migrate(path: str) -> int:
+    with sqlite3.connect(path, isolation_level=None) as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            migrated = migrate_legacy_accounts(conn)
+            for statement in SCHEMA_SQL:
+                conn.execute(statement)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='accounts.db files to convert')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        try:
+            with sqlite3.connect(path) as conn:
+                legacy = is_legacy_schema(conn)
+            if not legacy:
+                print(f'{path}: already migrated')
+                continue
+            print(f'{path}: migrated {migrate(path)} accounts')
+        except sqlite3.Error as e:
+            print(f'{path}: failed - {e}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the handful of Polygon REST endpoints market.py uses, so price lookups
+can be exercised offline. Prices are deterministic per symbol (with a small per-minute wobble).
+
+    uv run polygon_stub.py --port 8765
+    POLYGON_BASE_URL=http://127.0.0.1:8765 POLYGON_API_KEY=stub uv run trading_floor.py
+
+Or in-process: server, url = start_stub(); ... ; server.shutdown()
+"""
+import argparse
+import json
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+DEFAULT_TICKERS = [
+    "AAPL", "AMAT", "AMD", "AMZN", "ASML", "AVGO", "GOOGL", "INTC", "META", "MRVL", "MSFT", "MU",
+    "NVDA", "NXPI", "QCOM", "SMH", "SOXX", "SPY", "TSEM", "TSLA", "TSM",
+]
+
+
+def stub_price(symbol: str, minute: int | None = None) -> float:
+    ''' Deterministic price for a symbol; pass a minute number to get the intraday wobble '''
+    base = 10 + (zlib.crc32(symbol.encode()) % 49_000) / 100
+    if minute is None:
+        return round(base, 2)
+    wobble = ((zlib.crc32(f"{symbol}{minute}".encode()) % 200) - 100) / 10_000  # +-1%
+    return round(base * (1 + wobble), 2)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload: dict | list):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        minute = int(time.time() // 60)
+        now_ms = int(time.time() * 1000)
+
+        # /v2/aggs/ticker/{ticker}/prev
+        if parts[:3] == ["v2", "aggs", "ticker"] and parts[-1] == "prev":
+            self.server.calls["previous_close"] += 1
+            ticker = parts[3]
+            yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+            return self._send({"results": [
+                {"T": ticker, "c": stub_price(ticker), "t": int(yesterday.timestamp() * 1000)}
+            ]})
+
+        # /v2/aggs/grouped/locale/us/market/stocks/{date}
+        if parts[:3] == ["v2", "aggs", "grouped"]:
+            self.server.calls["grouped_daily"] += 1
+            return self._send({"results": [
+                {"T": ticker, "c": stub_price(ticker), "t": now_ms} for ticker in self.server.tickers
+            ]})
+
+        # /v2/snapshot/locale/us/markets/stocks/tickers[/{ticker}]
+        if parts[:2] == ["v2", "snapshot"] and "tickers" in parts:
+            after = parts[parts.index("tickers") + 1:]
+            if after:
+                self.server.calls["snapshot_ticker"] += 1
+                if after[0] not in self.server.known:
+                    return self.send_error(404, f"unknown ticker {after[0]}")
+                return self._send({"ticker": self._snapshot(after[0], minute)})
+            self.server.calls["snapshot_all"] += 1
+            requested = query.get("tickers", [""])[0]
+            tickers = requested.split(",") if requested else self.server.tickers
+            # like Polygon, unknown symbols are simply missing from the response
+            return self._send({"tickers": [
+                self._snapshot(ticker, minute) for ticker in tickers if ticker in self.server.known
+            ]})
+
+        # /v1/marketstatus/now
+        if parts == ["v1", "marketstatus", "now"]:
+            self.server.calls["market_status"] += 1
+            return self._send({"market": "open" if self.server.market_open else "closed"})
+
+        # /v1/marketstatus/upcoming
+        if parts == ["v1", "marketstatus", "upcoming"]:
+            self.server.calls["market_holidays"] += 1
+            return self._send([])
+
+        self.send_error(404, f"stub has no endpoint {url.path}")
+
+    @staticmethod
+    def _snapshot(ticker: str, minute: int) -> dict:
+        return {
+            "ticker": ticker,
+            "min": {"c": stub_price(ticker, minute)},
+            "prevDay": {"c": stub_price(ticker)},
+        }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tickers: list[str], market_open: bool = True):
+        super().__init__(address, StubHandler)
+        self.tickers = tickers
+        self.known = set(tickers)
+        self.market_open = market_open
+        self.calls: Counter = Counter()  # requests served per endpoint
+
+
+def make_tickers(extra: int) -> list[str]:
+    ''' DEFAULT_TICKERS plus `extra` synthetic symbols, to mimic a full ~10k grouped-daily response '''
+    return DEFAULT_TICKERS + [f"X{i:05d}" for i in range(extra)]
+
+
+def start_stub(port: int = 0, extra_tickers: int = 0, market_open: bool = True) -> tuple[StubServer, str]:
+    ''' Start the stub on a background thread; returns the server and its base URL '''
+    server = StubServer(("127.0.0.1", port), make_tickers(extra_tickers), market_open)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--extra-tickers", type=int, default=0, help="synthetic symbols added to grouped-daily")
+    parser.add_argument("--closed", action="store_true", help="report the market as closed")
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", args.port), make_tickers(args.extra_tickers), not args.closed)
+    print(f"Polygon stub listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Callable
+from database import write_prices, read_prices
+
+
+class PriceCache:
+    '''
+    Process-wide symbol -> price cache with a TTL and single-flight misses.
+
+    When several threads (traders, the dashboard) miss on the same symbol at once, only the
+    first one calls the upstream fetch; the rest wait for its result instead of issuing their
+    own request. Entries can optionally be persisted to the prices table, one row per symbol,
+    so a restart starts warm.
+    '''
+
+    def __init__(self, ttl: float, persist_key: str | None = None):
+        self.ttl = ttl
+        self.persist_key = persist_key
+        self._prices: dict[str, tuple[float, float]] = {}  # symbol -> (price, fetched at epoch seconds)
+        self._inflight: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._loaded = persist_key is None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # misses served by another thread's in-flight fetch
+        self.fetches = 0    # upstream calls actually made
+        self.errors = 0
+
+    def _load_persisted(self) -> None:
+        # called with the lock held, once
+        self._loaded = True
+        try:
+            stored = read_prices(self.persist_key, time.time() - self.ttl)
+        except Exception:
+            return
+        for symbol, (price, fetched_at) in stored.items():
+            self._prices.setdefault(symbol, (price, fetched_at))
+
+    def _persist(self, symbols: list[str]) -> None:
+        # only what this miss fetched, so the write doesn't grow with the cache
+        if not self.persist_key:
+            return
+        with self._lock:
+            fetched = {symbol: self._prices[symbol] for symbol in symbols if symbol in self._prices}
+        write_prices(self.persist_key, fetched)
+
+    def get_many(self, symbols: list[str], fetch: Callable[[list[str]], dict[str, float]]) -> dict[str, float]:
+        ''' Return {symbol: price}, calling fetch(missing_symbols) at most once for the fresh misses '''
+        now = time.time()
+        result: dict[str, float] = {}
+        to_fetch: list[str] = []
+        waits: list[tuple[str, threading.Event]] = []
+
+        with self._lock:
+            if not self._loaded:
+                self._load_persisted()
+            for symbol in symbols:
+                entry = self._prices.get(symbol)
+                if entry and now - entry[1] < self.ttl:
+                    result[symbol] = entry[0]
+                    self.hits += 1
+                elif symbol in self._inflight:
+                    waits.append((symbol, self._inflight[symbol]))
+                    self.coalesced += 1
+                else:
+                    self._inflight[symbol] = threading.Event()
+                    to_fetch.append(symbol)
+                    self.misses += 1
+
+        if to_fetch:
+            try:
+                fetched = fetch(to_fetch)
+                stamp = time.time()
+                with self._lock:
+                    self.fetches += 1
+                    for symbol in to_fetch:
+                        price = fetched.get(symbol, 0.0)
+                        self._prices[symbol] = (price, stamp)
+                        result[symbol] = price
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    for symbol in to_fetch:
+                        self._inflight.pop(symbol).set()
+            self._persist(to_fetch)
+
+        for symbol, event in waits:
+            event.wait()
+            entry = self._prices.get(symbol)
+            if entry is None:
+                # the leader's fetch failed; try (and possibly fail) ourselves
+                result.update(self.get_many([symbol], fetch))
+            else:
+                result[symbol] = entry[0]
+
+        return {symbol: result[symbol] for symbol in symbols}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._prices.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "fetches": self.fetches,
+            "errors": self.errors,
+            "size": len(self._prices),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import time
+from typing import Awaitable, Callable
+
+
+class Job:
+    ''' One scheduled coroutine function and its run metrics '''
+
+    def __init__(self, name: str, run: Callable[[], Awaitable], period: float, offset: float, housekeeping: bool):
+        self.name = name
+        self.run = run
+        self.period = period
+        self.offset = offset
+        self.housekeeping = housekeeping
+        self.next_due = 0.0
+        self.task: asyncio.Task | None = None
+        self.runs = 0
+        self.errors = 0
+        self.overlaps = 0       # ticks skipped because the previous run was still going
+        self.missed = 0         # ticks that passed while the scheduler itself was held up
+        self.closed = 0         # ticks skipped by the gate (market closed)
+        self.last_lag = 0.0     # seconds between the tick and the run actually starting
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_seconds: float | None = None
+        self.last_error: str | None = None
+
+
+class Scheduler:
+    '''
+    Fixed-rate scheduler for the trading floor.
+
+    Every job has its own period and ticks at start + offset + k * period however long its
+    runs take, so the cycle doesn't drift and a slow job never delays another. A tick that
+    arrives while the job's previous run is still going is skipped (and counted as an overlap)
+    rather than queued. Runs wait for one of max_concurrency slots, and the wait shows up as
+    lag. The gate is asked before each run, so a closed market skips it; given reopens_in
+    (seconds until the gate opens again), a skipped job sleeps straight through to the
+    reopening and its schedule restarts from there. Housekeeping jobs skip both the gate and
+    the slots.
+
+        scheduler = Scheduler(max_concurrency=2, gate=market_is_open, reopens_in=seconds_until_open)
+        scheduler.add("Sam", trader.run, period=3600)
+        await scheduler.run()
+    '''
+
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        gate: Callable[[], Awaitable[bool]] | None = None,
+        reopens_in: Callable[[], float] | None = None,
+    ):
+        self.gate = gate
+        self.reopens_in = reopens_in
+        self.jobs: list[Job] = []
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._wake = asyncio.Event()
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[], Awaitable],
+        period: float,
+        offset: float = 0.0,
+        housekeeping: bool = False,
+    ) -> Job:
+        if period <= 0:
+            raise ValueError(f"{name}: period must be positive, not {period}")
+        job = Job(name, run, period, offset, housekeeping)
+        self.jobs.append(job)
+        self._wake.set()
+        return job
+
+    async def run(self) -> None:
+        ''' Tick jobs forever; cancel to stop (runs in flight are cancelled with it) '''
+        loop = asyncio.get_running_loop()
+        for job in self.jobs:
+            job.next_due = loop.time() + job.offset
+        try:
+            while True:
+                now = loop.time()
+                for job in self.jobs:
+                    if job.next_due <= now:
+                        self._tick(job, now)
+                due = min((job.next_due for job in self.jobs), default=now + 60)
+                self._wake.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), max(0.0, due - loop.time()))
+        finally:
+            running = [job.task for job in self.jobs if job.task and not job.task.done()]
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    def _tick(self, job: Job, now: float) -> None:
+        due = job.next_due
+        # anchored to the schedule, not to when the last run finished; whole periods the loop slept through are skipped
+        missed = int((now - due) // job.period)
+        job.missed += missed
+        job.next_due = due + (missed + 1) * job.period
+        if job.task is not None and not job.task.done():
+            job.overlaps += 1
+            print(f"{job.name} is still running from its last tick, skipping this one")
+            return
+        job.task = asyncio.create_task(self._run_job(job, due + missed * job.period), name=f"job {job.name}")
+
+    async def _run_job(self, job: Job, due: float) -> None:
+        loop = asyncio.get_running_loop()
+        if not job.housekeeping and self.gate is not None and not await self.gate():
+            job.closed += 1
+            if self.reopens_in is None:
+                print(f"Market is closed, skipping {job.name}")
+                return
+            # no point ticking through the closed hours: re-anchor the job on the reopening
+            delay = max(0.0, self.reopens_in())
+            job.next_due = loop.time() + delay + job.offset
+            self._wake.set()
+            print(f"Market is closed, {job.name} sleeps {delay / 3600:.1f}h until it opens")
+            return
+        async with self._slots if self._slots and not job.housekeeping else contextlib.nullcontext():
+            start = loop.time()
+            job.last_lag = start - due
+            job.max_lag = max(job.max_lag, job.last_lag)
+            job.total_lag += job.last_lag
+            job.runs += 1
+            started = time.perf_counter()
+            try:
+                # jobs may report failure by returning an error string (Trader.run does) as well as by raising
+                error = await job.run()
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            job.last_seconds = time.perf_counter() - started
+        if isinstance(error, str):
+            job.errors += 1
+            job.last_error = error
+        if not job.housekeeping:
+            print(f"{job.name}: ran {job.last_seconds:.0f}s, started {job.last_lag:.1f}s after its tick"
+                  + (f", failed: {error}" if isinstance(error, str) else ""))
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "job": job.name,
+                "period": job.period,
+                "running": job.task is not None and not job.task.done(),
+                "runs": job.runs,
+                "errors": job.errors,
+                "overlaps": job.overlaps,
+                "missed": job.missed,
+                "closed": job.closed,
+                "last_lag": job.last_lag,
+                "max_lag": job.max_lag,
+                "avg_lag": job.total_lag / job.runs if job.runs else 0.0,
+                "last_seconds": job.last_seconds,
+                "last_error": job.last_error,
+            }
+            for job in self.jobs
+        ]
@@ -0,0 +1,166 @@
+"""
+Fire hundreds of concurrent trades at one account and check nothing was lost.
+
+Trades come from asyncio tasks (concurrent MCP tool calls), threads and separate processes,
+each on its own Account copy, the way accounts_server handles parallel tool calls. Every copy
+writes through the versioned record_trade, so a copy that lost the race reloads and redoes
+its trade. Afterwards the account must agree with its own transaction history.
+
+    uv run stress_trades.py --trades 400
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import accounts
+import async_database
+import database
+from accounts import Account, INITIAL_BALANCE
+
+NAME = "stress"
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN"]
+PRICE = 10.0
+
+
+def fixed_price(symbol: str) -> float:
+    # a fixed price keeps the expected balance a pure function of the recorded transactions
+    return PRICE
+
+
+def trade(account: Account, rng: random.Random) -> bool:
+    symbol = rng.choice(SYMBOLS)
+    quantity = rng.randint(1, 5)
+    try:
+        if rng.random() < 0.6:
+            account.buy_shares(symbol, quantity, "stress")
+        else:
+            account.sell_shares(symbol, quantity, "stress")
+        return True
+    except ValueError:  # not enough cash or shares at the time: refused, and nothing written
+        return False
+
+
+async def atrade(account: Account, rng: random.Random) -> bool:
+    symbol = rng.choice(SYMBOLS)
+    quantity = rng.randint(1, 5)
+    try:
+        if rng.random() < 0.6:
+            await account.abuy_shares(symbol, quantity, "stress")
+        else:
+            await account.asell_shares(symbol, quantity, "stress")
+        return True
+    except ValueError:
+        return False
+
+
+def setup(path: str) -> None:
+    database.use_database(path)
+    accounts.get_share_price = fixed_price
+    accounts.get_share_prices = lambda symbols: {symbol: PRICE for symbol in symbols}
+
+
+async def run_tasks(trades: int, seed: int) -> int:
+    async def one(i):
+        account = await Account.aget(NAME, lazy=True)
+        return await atrade(account, random.Random(seed + i))
+
+    try:
+        return sum(await asyncio.gather(*[one(i) for i in range(trades)]))
+    finally:
+        await async_database.close_connections()
+
+
+def run_threads(trades: int, seed: int, threads: int = 8) -> int:
+    def one(i):
+        return trade(Account.get(NAME, lazy=True), random.Random(seed + i))
+
+    with ThreadPoolExecutor(threads) as pool:
+        return sum(pool.map(one, range(trades)))
+
+
+def process_worker(path: str, trades: int, seed: int) -> int:
+    setup(path)
+    return sum(trade(Account.get(NAME, lazy=True), random.Random(seed + i)) for i in range(trades))
+
+
+def check(path: str) -> list[str]:
+    ''' The account's state against its transaction history; returns the broken invariants '''
+    conn = sqlite3.connect(path)
+    failures = []
+    balance, net_invested = conn.execute(
+        "SELECT balance, net_invested FROM accounts WHERE name = ?", (NAME,)
+    ).fetchone()
+    spent, count = conn.execute(
+        "SELECT COALESCE(SUM(quantity * price), 0), COUNT(*) FROM transactions WHERE name = ?", (NAME,)
+    ).fetchone()
+    if abs(balance - (INITIAL_BALANCE - spent)) > 1e-6:
+        failures.append(f"balance {balance:.4f} != {INITIAL_BALANCE} - transactions {spent:.4f}")
+    if balance < -1e-9:
+        failures.append(f"negative balance {balance}")
+    if abs(net_invested - spent) > 1e-6:
+        failures.append(f"net_invested {net_invested:.4f} != transactions {spent:.4f}")
+    expected = dict(conn.execute(
+        "SELECT symbol, SUM(quantity) FROM transactions WHERE name = ? GROUP BY symbol HAVING SUM(quantity) != 0", (NAME,)
+    ).fetchall())
+    holdings = dict(conn.execute("SELECT symbol, quantity FROM holdings WHERE name = ?", (NAME,)).fetchall())
+    if holdings != expected:
+        failures.append(f"holdings {holdings} != transactions {expected}")
+    if any(quantity < 0 for quantity in expected.values()):
+        failures.append(f"oversold {expected}")
+    lots = dict(conn.execute("SELECT symbol, SUM(quantity) FROM lots WHERE name = ? GROUP BY symbol", (NAME,)).fetchall())
+    if lots != holdings:
+        failures.append(f"open lots {lots} != holdings {holdings}")
+    logged = conn.execute(
+        "SELECT COUNT(*) FROM logs WHERE name = ? AND type = 'account' AND (message LIKE 'Bought %' OR message LIKE 'Sold %')",
+        (NAME,),
+    ).fetchone()[0]
+    if logged != count:
+        failures.append(f"{logged} trade log rows for {count} transactions")
+    conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trades", type=int, default=400, help="trades per mode")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "stress.db")
+        setup(path)
+        Account.get(NAME).reset("stress test")
+        start = time.perf_counter()
+
+        done = asyncio.run(run_tasks(args.trades, args.seed))
+        print(f"asyncio tasks: {done}/{args.trades} trades went through")
+        done = run_threads(args.trades, args.seed + args.trades)
+        print(f"threads:       {done}/{args.trades} trades went through")
+        per_process = args.trades // args.processes
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            done = sum(pool.starmap(process_worker, [
+                (path, per_process, args.seed + 2 * args.trades + i * per_process) for i in range(args.processes)
+            ]))
+        print(f"processes:     {done}/{per_process * args.processes} trades went through")
+
+        elapsed = time.perf_counter() - start
+        database.close_connections()
+        failures = check(path)
+        version = sqlite3.connect(path).execute("SELECT version FROM accounts WHERE name = ?", (NAME,)).fetchone()[0]
+        print(f"{elapsed:.1f}s, account at version {version}")
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        if failures:
+            raise SystemExit(1)
+        print("all invariants hold")
+
+
+if __name__ == "__main__":
+    main()
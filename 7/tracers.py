@@ -1,7 +1,12 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from log_writer import LogWriter
+from database import write_metrics
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
 import secrets
 import string
+import threading
+import time
 
 
 ALPHANUM = string.ascii_lowercase + string.digits
@@ -18,25 +23,45 @@ def make_trace_id(tag: str) -> str:
     return f"trace_{tag}{random_suffix}"
 
 
+def trader_name(trace_or_span: Trace | Span) -> str | None:
+    ''' The trader a trace or span belongs to, from the tag make_trace_id put in its id '''
+    name = trace_or_span.trace_id.split("_")[1]
+    if '0' in name:
+        return name.split("0")[0]
+    else:
+        return None
+
+
+def span_seconds(span: Span) -> float:
+    if not span.started_at or not span.ended_at:
+        return 0.0
+    return (datetime.fromisoformat(span.ended_at) - datetime.fromisoformat(span.started_at)).total_seconds()
+
+
 class LogTracer(TracingProcessor):
+    '''
+    Writes trace and span start/end lines to the logs table for the dashboard.
+    Entries go through a LogWriter so the event loop never waits on SQLite.
+    '''
+
+    def __init__(self, writer: LogWriter | None = None):
+        self.writer = writer or LogWriter()
+
+    def write_log(self, name: str, type: str, message: str) -> None:
+        self.writer.write(name, type, message)
 
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
-        trace_id = trace_or_span.trace_id
-        name = trace_id.split("_")[1]
-        if '0' in name:
-            return name.split("0")[0]
-        else:
-            return None
+        return trader_name(trace_or_span)
 
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Started: {trace.name}")
+            self.write_log(name, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+            self.write_log(name, "trace", f"Ended: {trace.name}")
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
@@ -52,7 +77,7 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.write_log(name, type, message)
 
     def on_span_end(self, span) -> None:
         name = self.get_name(span)
@@ -69,10 +94,117 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.write_log(name, type, message)
 
     def force_flush(self) -> None:
+        self.writer.flush()
+
+    def shutdown(self) -> None:
+        self.writer.close()
+
+class MetricsTracer(TracingProcessor):
+    '''
+    Adds up each trader run (one trace) from its spans and stores one trader_metrics row when it
+    ends: wall time, LLM turns with their tokens and time, and tool calls per tool and MCP server.
+    Rows are written from a worker thread, so ending a trace never waits on SQLite.
+    '''
+
+    def __init__(self):
+        self._runs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metrics-writer")
+        self._pending = set()
+
+    def on_trace_start(self, trace) -> None:
+        name = trader_name(trace)
+        # only the traders' own runs ('sam-trading'), not other traces whose random id happens to parse
+        if not name or not trace.name.lower().startswith(f"{name}-"):
+            return
+        with self._lock:
+            self._runs[trace.trace_id] = {
+                "name": name,
+                "run": trace.name,
+                "models": set(),
+                "started": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                "start": time.perf_counter(),
+                "llm_turns": 0,
+                "cached_turns": 0,
+                "llm_seconds": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "tool_calls": 0,
+                "tool_seconds": 0.0,
+                "errors": 0,
+                "tools": {},    # tool: [calls, seconds]
+                "servers": {},  # MCP server: [calls, seconds]
+            }
+
+    def on_span_start(self, span) -> None:
         pass
 
+    def on_span_end(self, span) -> None:
+        data = span.span_data
+        with self._lock:
+            run = self._runs.get(span.trace_id)
+            if run is None or data is None:
+                return
+            seconds = span_seconds(span)
+            run["errors"] += span.error is not None
+            if data.type == "generation":  # chat completions models (and replays from llm_cache)
+                usage = data.usage or {}
+                self._add_turn(run, data.model, seconds, usage.get("input_tokens"), usage.get("output_tokens"))
+                run["cached_turns"] += (data.model_config or {}).get("llm_cache") == "hit"
+            elif data.type == "response":  # the OpenAI responses API
+                response = data.response
+                usage = response.usage if response else None
+                self._add_turn(
+                    run, response.model if response else None, seconds,
+                    usage.input_tokens if usage else 0, usage.output_tokens if usage else 0,
+                )
+            elif data.type == "function":
+                run["tool_calls"] += 1
+                run["tool_seconds"] += seconds
+                self._add_call(run["tools"], data.name, seconds)
+                if data.mcp_data and data.mcp_data.get("server"):
+                    self._add_call(run["servers"], data.mcp_data["server"], seconds)
+
+    @staticmethod
+    def _add_turn(run: dict, model: str | None, seconds: float, input_tokens: int | None, output_tokens: int | None) -> None:
+        run["llm_turns"] += 1
+        run["llm_seconds"] += seconds
+        run["input_tokens"] += input_tokens or 0
+        run["output_tokens"] += output_tokens or 0
+        if model:
+            run["models"].add(model)
+
+    @staticmethod
+    def _add_call(calls: dict, key: str, seconds: float) -> None:
+        call = calls.setdefault(key, [0, 0.0])
+        call[0] += 1
+        call[1] = round(call[1] + seconds, 3)
+
+    def on_trace_end(self, trace) -> None:
+        with self._lock:
+            run = self._runs.pop(trace.trace_id, None)
+        if run is None:
+            return
+        run["seconds"] = time.perf_counter() - run.pop("start")
+        run["ended"] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        run["model"] = ", ".join(sorted(run.pop("models"))) or None
+        future = self._executor.submit(self._write, run)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    @staticmethod
+    def _write(run: dict) -> None:
+        try:
+            write_metrics(run)
+        except Exception as e:
+            print(f"Metrics tracer failed to write {run['name']}'s run: {e}")
+
+    def force_flush(self) -> None:
+        wait(list(self._pending), timeout=10)
+
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        self.force_flush()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,196 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Callable
+from agents import add_trace_processor
+from tracers import LogTracer, MetricsTracer
+from traders import Trader
+from mcp_pool import MCPServerPool
+
+
+TRADER_TIMEOUT_SECONDS = int(os.getenv("TRADER_TIMEOUT_SECONDS") or 900)  # a run taking longer is killed
+START_TIMEOUT_SECONDS = 120  # a worker has this long to import and build its Trader, on top of the run timeout
+STOP_TIMEOUT_SECONDS = 30  # how long a worker gets to finish its run and flush its logs on shutdown
+
+# spawn: a fresh interpreter per worker, not a fork of the supervisor's event loop, threads and sqlite connections
+_context = multiprocessing.get_context("spawn")
+
+READY = "ready"  # first message from a worker, once it can take runs
+
+
+def serve_trader(conn: Connection, name: str, lastname: str, model_name: str, use_mcp_pool: bool) -> None:
+    '''
+    Worker process entry point: one Trader, kept alive across cycles with its own MCP server pool.
+    The worker says READY, then each message from the supervisor is do_trade for the next run
+    (None to stop) and each reply is that run's error, or None.
+    '''
+    add_trace_processor(LogTracer())
+    add_trace_processor(MetricsTracer())
+
+    async def serve():
+        async with MCPServerPool() as pool:
+            trader = Trader(name, lastname, model_name, pool if use_mcp_pool else None)
+            conn.send(READY)
+            while (do_trade := await asyncio.to_thread(conn.recv)) is not None:
+                trader.do_trade = do_trade
+                conn.send(await trader.run())
+
+    asyncio.run(serve())
+
+
+class TraderWorker:
+    ''' The supervisor's handle on one trader's worker process '''
+
+    def __init__(self, name: str, lastname: str, model_name: str, use_mcp_pool: bool, target: Callable = serve_trader):
+        self.name = name
+        self.args = (name, lastname, model_name, use_mcp_pool)
+        self.target = target
+        self.process: multiprocessing.process.BaseProcess | None = None
+        self.conn: Connection | None = None
+        self.ready = False
+        # kept here rather than in the worker so a restart doesn't lose the trade/rebalance alternation
+        self.do_trade = True
+        self.runs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_error: str | None = None
+        self.last_seconds: float | None = None
+
+    def start(self) -> None:
+        conn, child_conn = _context.Pipe()
+        self.process = _context.Process(
+            target=self.target, args=(child_conn, *self.args), name=f"trader-{self.name}", daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = conn
+        self.ready = False
+
+    def kill(self) -> None:
+        # blocks for up to a few seconds; the supervisor runs it in its executor, off the event loop
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+
+    async def restart(self, reason: str, executor: ThreadPoolExecutor) -> None:
+        self.last_error = reason
+        await asyncio.get_running_loop().run_in_executor(executor, self.kill)
+        self.restarts += 1
+        self.start()
+
+    async def run(self, timeout: float, executor: ThreadPoolExecutor) -> str | None:
+        ''' One run in the worker; returns its error (including a timeout or crash) or None '''
+        loop = asyncio.get_running_loop()
+        if self.process is None:
+            self.start()
+        elif not self.process.is_alive():
+            await self.restart(f"worker exited between runs (exit code {self.process.exitcode})", executor)
+        start = time.perf_counter()
+        try:
+            # the first run after a (re)start waits for the worker's imports without eating into the run timeout
+            if not self.ready:
+                if not await loop.run_in_executor(executor, self.conn.poll, START_TIMEOUT_SECONDS):
+                    raise TimeoutError(f"worker not ready after {START_TIMEOUT_SECONDS}s")
+                self.ready = self.conn.recv() == READY
+                start = time.perf_counter()
+            self.conn.send(self.do_trade)
+            # poll in the supervisor's own threads, so dozens of waiting workers can't starve asyncio.to_thread
+            if await loop.run_in_executor(executor, self.conn.poll, timeout):
+                error = self.conn.recv()
+            else:
+                error = f"timed out after {timeout:.0f}s"
+                await self.restart(error, executor)
+        except TimeoutError as e:
+            error = str(e)
+            await self.restart(error, executor)
+        except (EOFError, OSError) as e:
+            await loop.run_in_executor(executor, self.process.join, 1)
+            error = f"worker crashed (exit code {self.process.exitcode}): {e!r}"
+            await self.restart(error, executor)
+        self.last_seconds = time.perf_counter() - start
+        self.do_trade = not self.do_trade
+        self.runs += 1
+        if error:
+            self.failures += 1
+            self.last_error = error
+        return error
+
+    async def stop(self, executor: ThreadPoolExecutor) -> None:
+        if self.process is None or not self.process.is_alive():
+            return
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, self.process.join, STOP_TIMEOUT_SECONDS)
+        await loop.run_in_executor(executor, self.kill)
+
+
+class TraderWorkerPool:
+    '''
+    Supervisor that runs each trader in its own long-lived worker process.
+
+    Workers start once and keep their Trader (and its MCP servers) warm across cycles. run_all()
+    starts every trader at once and collects the results; a run that exceeds the timeout is
+    killed, and a worker that crashed or was killed is restarted for the next cycle, so one
+    stuck or CPU-heavy trader no longer holds up the others.
+
+        async with TraderWorkerPool([("Sam", "Lu", "gpt-4o-mini"), ...]) as workers:
+            errors = await workers.run_all()   # {name: error or None}
+    '''
+
+    def __init__(
+        self,
+        traders: list[tuple[str, str, str]],
+        use_mcp_pool: bool = True,
+        timeout: float = TRADER_TIMEOUT_SECONDS,
+        target: Callable = serve_trader,
+    ):
+        self.timeout = timeout
+        self.workers = [TraderWorker(*trader, use_mcp_pool, target) for trader in traders]
+        self._executor = ThreadPoolExecutor(max_workers=len(self.workers) or 1, thread_name_prefix="trader-worker")
+
+    async def __aenter__(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def run_trader(self, name: str) -> str | None:
+        ''' One run of the named trader's worker; returns its error or None '''
+        worker = next(worker for worker in self.workers if worker.name == name)
+        return await worker.run(self.timeout, self._executor)
+
+    async def run_all(self) -> dict[str, str | None]:
+        errors = await asyncio.gather(*[worker.run(self.timeout, self._executor) for worker in self.workers])
+        return {worker.name: error for worker, error in zip(self.workers, errors)}
+
+    def status(self) -> list[dict]:
+        return [
+            {
+                "trader": worker.name,
+                "pid": worker.process.pid if worker.process else None,
+                "alive": worker.process is not None and worker.process.is_alive(),
+                "runs": worker.runs,
+                "failures": worker.failures,
+                "restarts": worker.restarts,
+                "last_seconds": worker.last_seconds,
+                "last_error": worker.last_error,
+            }
+            for worker in self.workers
+        ]
+
+    async def close(self) -> None:
+        await asyncio.gather(*[worker.stop(self._executor) for worker in self.workers])
+        self._executor.shutdown(wait=False)
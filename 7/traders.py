@@ -1,12 +1,10 @@
 from contextlib import AsyncExitStack
-from accounts_client import read_accounts_resource, read_strategy_resource
+from accounts_client import AccountsClient, get_accounts_client
 from tracers import make_trace_id
 from agents import Agent, Runner, OpenAIChatCompletionsModel, trace, Tool
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
-import json
-from agents.mcp import MCPServerStdio, MCPServerStdioParams
 from templates import (
     researcher_instructions,
     trader_instructions,
@@ -15,6 +13,9 @@ from templates import (
     research_tool,
 )
 from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from mcp_inprocess import create_mcp_server
+from mcp_pool import MCPServerPool
+from llm_cache import cached_model
 import traceback
 
 
@@ -35,12 +36,13 @@ gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
 
 
 def get_model(model_name: str):
+    # recorded / replayed from disk when LLM_CACHE is set (see llm_cache.py)
     if "deepseek" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client)
+        return cached_model(model_name, OpenAIChatCompletionsModel(model=model_name, openai_client=deepseek_client))
     elif "gemini" in model_name:
-        return OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client)
+        return cached_model(model_name, OpenAIChatCompletionsModel(model=model_name, openai_client=gemini_client))
     else:
-        return model_name
+        return cached_model(model_name, model_name)
     
 async def get_researcher(mcp_servers, model_name) -> Agent:
     researcher = Agent(
@@ -57,12 +59,26 @@ async def get_researcher_tool(mcp_servers, model_name) -> Tool:
 
 
 class Trader:
-    def __init__(self, name: str, lastname='Trader', model_name='gpt-4o-mini'):
+    def __init__(
+        self,
+        name: str,
+        lastname='Trader',
+        model_name='gpt-4o-mini',
+        mcp_pool: MCPServerPool | None = None,
+        accounts_client: AccountsClient | None = None,
+    ):
         self.name = name
         self.lastname = lastname
         self.agent = None
         self.model_name = model_name
         self.do_trade = True
+        self.mcp_pool = mcp_pool
+        self._accounts_client = accounts_client
+
+    @property
+    def accounts_client(self) -> AccountsClient:
+        # one warm accounts session shared by all traders, rather than a new process per read
+        return self._accounts_client or get_accounts_client()
 
     async def create_agent(self, trader_mcp_servers, researcher_mcp_servers) -> Agent:
         tool = await get_researcher_tool(researcher_mcp_servers, self.model_name)
@@ -76,15 +92,13 @@ class Trader:
         return self.agent
     
     async def get_account_report(self) -> str:
-        account = await read_accounts_resource(self.name)
-        account_json = json.loads(account)
-        account_json.pop('portfolio_value_time_series', None)
-        return json.dumps(account_json)
+        # the trimmed, cached summary rather than the full report, which also records a snapshot
+        return await self.accounts_client.read_summary_resource(self.name)
     
     async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
         account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        strategy = await self.accounts_client.read_strategy_resource(self.name)
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
@@ -92,19 +106,23 @@ class Trader:
         )
         await Runner.run(self.agent, message, max_turns=MAX_TURNS)
 
+    async def run_with_pooled_mcp_servers(self, pool: MCPServerPool):
+        # warm servers from the trading floor's pool instead of spawning a dozen processes per cycle
+        async with pool.lease(trader_mcp_server_params) as trader_mcp_servers:
+            async with pool.lease(researcher_mcp_server_params(self.name)) as research_mcp_servers:
+                await self.run_agent(trader_mcp_servers, research_mcp_servers)
+
     async def run_with_mcp_servers(self):
+        if self.mcp_pool:
+            return await self.run_with_pooled_mcp_servers(self.mcp_pool)
         async with AsyncExitStack() as stack:
             trader_mcp_servers = [
-                await stack.enter_async_context(
-                    MCPServerStdio(MCPServerStdioParams(**params), client_session_timeout_seconds=120)
-                )
+                await stack.enter_async_context(create_mcp_server(params))
                 for params in trader_mcp_server_params
             ]
             async with AsyncExitStack() as stack:
                 research_mcp_servers = [
-                    await stack.enter_async_context(
-                        MCPServerStdio(MCPServerStdioParams(**params), client_session_timeout_seconds=120)
-                    )
+                    await stack.enter_async_context(create_mcp_server(params))
                     for params in researcher_mcp_server_params(self.name)
                 ]
                 await self.run_agent(trader_mcp_servers, research_mcp_servers)
@@ -115,11 +133,15 @@ class Trader:
         with trace(trace_name, trace_id=trace_id):
             await self.run_with_mcp_servers()
 
-    async def run(self):
+    async def run(self) -> str | None:
+        ''' One trading or rebalancing session; returns what went wrong, or None '''
+        error = None
         try:
             await self.run_with_trace()
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
             traceback.print_exc()
+            error = f"{type(e).__name__}: {e}"
             
-        self.do_trade = not self.do_trade
\ No newline at end of file
+        self.do_trade = not self.do_trade
+        return error
\ No newline at end of file
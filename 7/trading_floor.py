@@ -1,9 +1,15 @@
 from traders import Trader
 from typing import List
+from functools import partial
+from contextlib import nullcontext
 import asyncio
-from tracers import LogTracer
+from tracers import LogTracer, MetricsTracer
 from agents import add_trace_processor
-from market import is_market_open
+from market_calendar import is_market_open, seconds_until_open
+from mcp_pool import MCPServerPool
+from trader_workers import TraderWorkerPool
+from scheduler import Scheduler
+from log_retention import run_retention
 from dotenv import load_dotenv
 import os
 
@@ -13,6 +19,9 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
     os.getenv("RUN_EVEN_WHEN_MARKET_IS_CLOSED", "false").strip().lower() == "true"
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+USE_MCP_SERVER_POOL = (os.getenv("USE_MCP_SERVER_POOL") or "true").strip().lower() == "true"
+USE_TRADER_PROCESSES = os.getenv("USE_TRADER_PROCESSES", "false").strip().lower() == "true"
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS") or 0)  # 0: no limit
 
 names = ["Sam", "Chris", "Kobe", "Alex"]
 lastnames = ["Lu", "Jim", "Kai", "Wu"]
@@ -30,21 +39,62 @@ else:
     short_model_names = ["GPT 4o mini"] * 4
 
 
-def create_traders() -> List[Trader]:
+def trader_specs() -> list[tuple[str, str, str]]:
+    return list(zip(names, lastnames, model_names))
+
+
+def create_traders(mcp_pool: MCPServerPool | None = None) -> List[Trader]:
     traders = []
-    for name, lastname, model_name in zip(names, lastnames, model_names):
-        traders.append(Trader(name, lastname, model_name))
+    for name, lastname, model_name in trader_specs():
+        traders.append(Trader(name, lastname, model_name, mcp_pool))
     return traders
 
+
+def run_every_minutes(name: str) -> int:
+    ''' A trader's own period, e.g. RUN_EVERY_N_MINUTES_SAM=30, else RUN_EVERY_N_MINUTES '''
+    return int(os.getenv(f"RUN_EVERY_N_MINUTES_{name.upper()}", RUN_EVERY_N_MINUTES))
+
+
+async def market_gate() -> bool:
+    # answered from the in-memory exchange calendar, so no thread or network call per tick
+    return RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open()
+
+
+async def retention() -> None:
+    try:
+        await asyncio.to_thread(run_retention)
+    except Exception as e:
+        print(f"Log retention failed: {e}")
+
+
+async def run_scheduled(runs: dict) -> None:
+    ''' Tick each trader's run on its own fixed-rate schedule, plus log retention '''
+    scheduler = Scheduler(
+        MAX_CONCURRENT_TRADERS or None,
+        gate=market_gate,
+        reopens_in=None if RUN_EVEN_WHEN_MARKET_IS_CLOSED else seconds_until_open,
+    )
+    for name, run in runs.items():
+        scheduler.add(name, run, run_every_minutes(name) * 60)
+    scheduler.add("log-retention", retention, RUN_EVERY_N_MINUTES * 60, housekeeping=True)
+    await scheduler.run()
+
+
+async def run_in_processes():
+    # each trader runs in its own worker process (see trader_workers.py); the workers trace for themselves
+    async with TraderWorkerPool(trader_specs(), USE_MCP_SERVER_POOL) as workers:
+        await run_scheduled({name: partial(workers.run_trader, name) for name, _, _ in trader_specs()})
+
+
 async def run_every_n_minutes():
+    if USE_TRADER_PROCESSES:
+        return await run_in_processes()
     add_trace_processor(LogTracer())
-    traders = create_traders()
-    while True:
-        if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
-        else:
-            print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+    add_trace_processor(MetricsTracer())
+    # the floor owns one pool of warm MCP servers for the whole run; traders lease from it each cycle
+    async with MCPServerPool() if USE_MCP_SERVER_POOL else nullcontext() as pool:
+        traders = create_traders(pool)
+        await run_scheduled({trader.name: trader.run for trader in traders})
 
 
 if __name__ == '__main__':